@@ -1,26 +1,425 @@
-import datetime
 import gzip
 import json
-from typing import Any, Dict, Optional
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
 
 import requests
+import requests.adapters
 
 import seventeenlands.logging_utils
 import seventeenlands.retry_utils
+from submission_outbox import SubmissionOutbox
+from submission_sinks import SubmissionSink
 
 
 logger = seventeenlands.logging_utils.get_logger('api_client')
 
 DEFAULT_HOST = 'https://www.17lands.com'
 
-_ERROR_COOLDOWN = datetime.timedelta(minutes=2)
-
-
-class ApiClient:
-
-    def __init__(self, host: str):
+DEFAULT_SUBMISSION_WORKERS = 4
+DEFAULT_SUBMISSION_QUEUE_SIZE = 256
+DEFAULT_POOL_SIZE = 2
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 10
+DEFAULT_READ_TIMEOUT_SECONDS = 60
+DEFAULT_REPLAY_RATE = 10
+REPLAY_PAGE_SIZE = 100
+DEFAULT_BATCH_WINDOW_SECONDS = 0.5
+DEFAULT_BATCH_SIZE = 50
+# Where e.g. a batch of 'pick' submissions is posted, if batching is turned on
+DEFAULT_BATCH_URL_TEMPLATE = 'batch/{endpoint}'
+# Small, frequent submissions that are worth sending together
+BATCHABLE_ENDPOINTS = frozenset(('pack', 'pick', 'human_draft_pack', 'human_draft_pick', 'inventory', 'api/rank'))
+DEFAULT_CLOSE_TIMEOUT_SECONDS = 5
+# How often a blocked put checks whether the client is closing
+_PUT_POLL_SECONDS = 0.1
+
+_STOP = object()
+_FLUSH = object()
+
+
+class ClientClosedError(Exception):
+    """Raised by submissions made after close(), and to cut short retries that close() gave up waiting for."""
+
+
+class ApiClient(SubmissionSink):
+    """
+    Client for the 17Lands API, and the sink that posts submissions to it.
+
+    submit_* calls are queued and return immediately; background workers post them. Each endpoint
+    is always handled by the same worker, so submissions to one endpoint are posted in the order
+    they were made, while a slow or retrying endpoint only holds up the endpoints sharing its worker.
+    When a worker's queue is full, submitting to it blocks.
+
+    Each thread making requests keeps its own requests.Session, so connections are kept alive and
+    reused instead of paying for a new TCP and TLS handshake per request.
+
+    With an outbox, every submission is stored on disk before it is queued and removed once it has
+    been posted, and whatever a previous run left undelivered is posted again at a limited rate.
+
+    With a batch URL template, submissions to BATCHABLE_ENDPOINTS are held by their worker for up to
+    batch_window seconds or batch_size submissions, then posted together as one gzipped JSON array.
+    If the host answers a batch with a 4xx status, that endpoint goes back to single posts.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        workers: int = DEFAULT_SUBMISSION_WORKERS,
+        queue_size: int = DEFAULT_SUBMISSION_QUEUE_SIZE,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT_SECONDS,
+        read_timeout: float = DEFAULT_READ_TIMEOUT_SECONDS,
+        outbox_filename: Optional[str] = None,
+        replay_rate: float = DEFAULT_REPLAY_RATE,
+        batch_url_template: Optional[str] = None,
+        batch_window: float = DEFAULT_BATCH_WINDOW_SECONDS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        """
+        :param pool_size:       Connections each thread's session keeps alive per host.
+        :param connect_timeout: Seconds to wait for a new connection.
+        :param read_timeout:    Seconds to wait for a response.
+        :param outbox_filename: SQLite database to keep undelivered submissions in. None keeps them only in memory.
+        :param replay_rate:     Submissions per second to replay from the outbox at startup.
+        :param batch_url_template: Endpoint to post batches to, formatted with the endpoint of the batched
+                                   submissions, e.g. DEFAULT_BATCH_URL_TEMPLATE. None posts every submission on its own.
+        :param batch_window:    Longest a submission waits for others to batch with, in seconds.
+        :param batch_size:      Most submissions in one batch.
+        """
+        super().__init__()
         self.host = host
-        self._last_error_posted_at = datetime.datetime.utcnow() - _ERROR_COOLDOWN
+        self._pool_size = pool_size
+        self._timeout = (connect_timeout, read_timeout)
+        self._local = threading.local()
+        self._sessions: List[requests.Session] = []
+        self._adapters: List[requests.adapters.HTTPAdapter] = []
+        # Counts from pools that were closed, so metrics still cover them
+        self._closed_connection_counts = {'requests': 0, 'connections': 0}
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads: List[threading.Thread] = []
+        self._threads_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._max_queue_depth = 0
+        self._endpoint_metrics: Dict[str, Dict[str, Any]] = {}
+        self._outbox = SubmissionOutbox(outbox_filename) if outbox_filename is not None else None
+        self._replay_rate = replay_rate
+        self._replay_thread: Optional[threading.Thread] = None
+        self._closed = False
+        # Set when close() starts: replay stops and blocked puts give up
+        self._stopping = threading.Event()
+        # Set when close() stops waiting: workers quit and retries in progress are abandoned
+        self._abandoned = threading.Event()
+        self._batch_url_template = batch_url_template
+        self._batch_window = batch_window
+        self._batch_size = batch_size
+        # Endpoints whose batch URL the host rejected; they go back to posting one submission at a time
+        self._unbatched_endpoints = set()
+        if self._outbox is not None and self._outbox.replay_up_to_id:
+            self._start_workers()
+
+    def _start_workers(self):
+        with self._threads_lock:
+            if self._closed:
+                raise ClientClosedError('ApiClient is closed')
+            if self._threads:
+                return
+            for index, submission_queue in enumerate(self._queues):
+                thread = threading.Thread(
+                    target=self._run_worker,
+                    args=(submission_queue, ),
+                    name=f'api-submit-{index}',
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+            if self._outbox is not None and self._outbox.replay_up_to_id:
+                self._replay_thread = threading.Thread(target=self._replay_outbox, name='api-replay', daemon=True)
+                self._replay_thread.start()
+
+    def _submit(self, endpoint: str, blob: Any, use_gzip=False):
+        self._start_workers()
+        outbox_id = self._outbox.append(endpoint, blob, use_gzip) if self._outbox is not None else None
+        if not self._enqueue(endpoint, blob, use_gzip, outbox_id) and outbox_id is None:
+            raise ClientClosedError(f'ApiClient closed before a submission to {endpoint} could be queued')
+
+    def _enqueue(self, endpoint: str, blob: Any, use_gzip: bool, outbox_id: Optional[int]) -> bool:
+        """:returns: False if the client started closing while the queue was full."""
+        submission_queue = self._queues[zlib.crc32(endpoint.encode('utf8')) % len(self._queues)]
+        item = (endpoint, blob, use_gzip, time.monotonic(), outbox_id)
+        while True:
+            try:
+                submission_queue.put(item, timeout=_PUT_POLL_SECONDS)
+                break
+            except queue.Full:
+                if self._stopping.is_set():
+                    return False
+        depth = submission_queue.qsize()
+        with self._metrics_lock:
+            self._max_queue_depth = max(self._max_queue_depth, depth)
+        return True
+
+    def _replay_outbox(self):
+        """Queue what previous runs left in the outbox, paced so a restart doesn't post it all at once."""
+        interval = 1 / self._replay_rate
+        last_id = 0
+        replayed = 0
+        while not self._stopping.is_set():
+            entries = self._outbox.get_pending(last_id, self._outbox.replay_up_to_id, REPLAY_PAGE_SIZE)
+            if not entries:
+                break
+            for entry in entries:
+                if self._stopping.wait(interval):
+                    break
+                if not self._enqueue(entry.endpoint, entry.blob, entry.use_gzip, entry.id):
+                    break
+                last_id = entry.id
+                replayed += 1
+        logger.info(f'Replayed {replayed} undelivered submissions from {self._outbox.filename}')
+
+    def _run_worker(self, submission_queue: queue.Queue):
+        # Per endpoint, the (blob, queued_at, outbox_id) items waiting to be posted as a batch
+        batches: Dict[str, List[tuple]] = {}
+        while True:
+            if batches:
+                self._post_due_batches(batches)
+            if batches:
+                deadline = min(items[0][1] for items in batches.values()) + self._batch_window
+                try:
+                    item = submission_queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    continue
+            else:
+                item = submission_queue.get()
+            try:
+                if self._abandoned.is_set():
+                    # close() has stopped waiting; whatever is left stays in the outbox
+                    return
+                if item is _STOP or item is _FLUSH:
+                    for endpoint in list(batches):
+                        self._post_batch(endpoint, batches.pop(endpoint))
+                    if item is _STOP:
+                        return
+                    continue
+                endpoint, blob, use_gzip, queued_at, outbox_id = item
+                if (
+                    self._batch_url_template is not None
+                    and endpoint in BATCHABLE_ENDPOINTS
+                    and endpoint not in self._unbatched_endpoints
+                ):
+                    items = batches.setdefault(endpoint, [])
+                    items.append((blob, queued_at, outbox_id))
+                    if len(items) >= self._batch_size:
+                        self._post_batch(endpoint, batches.pop(endpoint))
+                    continue
+                self._post_one(endpoint, blob, use_gzip, queued_at, outbox_id)
+            finally:
+                submission_queue.task_done()
+
+    def _post_due_batches(self, batches: Dict[str, List[tuple]]):
+        now = time.monotonic()
+        for endpoint in [endpoint for endpoint, items in batches.items() if items[0][1] + self._batch_window <= now]:
+            self._post_batch(endpoint, batches.pop(endpoint))
+
+    def _post_batch(self, endpoint: str, items: List[tuple]):
+        batch_endpoint = self._batch_url_template.format(endpoint=endpoint)
+        succeeded = True
+        try:
+            response = self._retry_post(endpoint=batch_endpoint, blob=[blob for blob, _, _ in items], use_gzip=True)
+        except ClientClosedError:
+            return
+        except Exception as e:
+            succeeded = False
+            logger.error(f'Giving up on batch of {len(items)} submissions to {batch_endpoint}: {e}')
+        else:
+            # _retry_post accepts any 4xx, but here that means the host doesn't take batches at this URL
+            if response is not None and 400 <= response.status_code < 500:
+                logger.warning(f'{batch_endpoint} rejected a batch with status {response.status_code}; '
+                               f'posting {endpoint} submissions one at a time instead')
+                self._unbatched_endpoints.add(endpoint)
+                for blob, queued_at, outbox_id in items:
+                    self._post_one(endpoint, blob, False, queued_at, outbox_id)
+                return
+        for _, queued_at, outbox_id in items:
+            self._finish_submission(endpoint, queued_at, outbox_id, succeeded)
+
+    def _post_one(self, endpoint: str, blob: Any, use_gzip: bool, queued_at: float, outbox_id: Optional[int]):
+        succeeded = True
+        try:
+            self._retry_post(endpoint=endpoint, blob=blob, use_gzip=use_gzip)
+        except ClientClosedError:
+            # Not a failed delivery, just an unfinished one
+            return
+        except Exception as e:
+            succeeded = False
+            logger.error(f'Giving up on submission to {endpoint}: {e}')
+        self._finish_submission(endpoint, queued_at, outbox_id, succeeded)
+
+    def _finish_submission(self, endpoint: str, queued_at: float, outbox_id: Optional[int], succeeded: bool):
+        if outbox_id is not None:
+            if succeeded:
+                self._outbox.mark_delivered(outbox_id)
+            else:
+                self._outbox.mark_failed(outbox_id)
+        self._record_submission(endpoint, time.monotonic() - queued_at, succeeded)
+
+    def _record_submission(self, endpoint: str, latency: float, succeeded: bool):
+        with self._metrics_lock:
+            metrics = self._endpoint_metrics.setdefault(endpoint, {
+                'submitted': 0,
+                'failed': 0,
+                'total_latency_seconds': 0.0,
+                'max_latency_seconds': 0.0,
+            })
+            metrics['submitted'] += 1
+            if not succeeded:
+                metrics['failed'] += 1
+            metrics['total_latency_seconds'] += latency
+            metrics['max_latency_seconds'] = max(metrics['max_latency_seconds'], latency)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depth, connection reuse and, per endpoint, submission counts and latency from queueing to completion."""
+        with self._metrics_lock:
+            endpoints = {
+                endpoint: dict(
+                    metrics,
+                    mean_latency_seconds=metrics['total_latency_seconds'] / metrics['submitted'],
+                )
+                for endpoint, metrics in self._endpoint_metrics.items()
+            }
+            metrics = {
+                'queue_depth': sum(submission_queue.qsize() for submission_queue in self._queues),
+                'max_queue_depth': self._max_queue_depth,
+                'endpoints': endpoints,
+            }
+        metrics['connections'] = self.get_connection_metrics()
+        if self._outbox is not None:
+            metrics['outbox_pending'] = self._outbox.count_pending()
+        return metrics
+
+    def format_metrics(self) -> str:
+        metrics = self.get_metrics()
+        endpoints = ', '.join(
+            f"{endpoint} {endpoint_metrics['submitted']} "
+            f"(mean {endpoint_metrics['mean_latency_seconds']:.3f}s, max {endpoint_metrics['max_latency_seconds']:.3f}s)"
+            for endpoint, endpoint_metrics in sorted(metrics['endpoints'].items())
+        )
+        connections = metrics['connections']
+        outbox = f"{metrics['outbox_pending']} pending in outbox; " if 'outbox_pending' in metrics else ''
+        return (
+            f"queue depth {metrics['queue_depth']} (max {metrics['max_queue_depth']}); "
+            f"{outbox}{connections['requests']} requests over {connections['connections']} connections; "
+            f"{endpoints or 'nothing submitted'}"
+        )
+
+    def flush(self):
+        """Wait until every submission queued so far has been posted (or given up on)."""
+        if self._closed:
+            return
+        if self._batch_url_template is not None:
+            # Post batches that are still waiting for their window to close
+            with self._threads_lock:
+                queues = self._queues if self._threads else []
+            for submission_queue in queues:
+                submission_queue.put(_FLUSH)
+        for submission_queue in self._queues:
+            submission_queue.join()
+        if self._outbox is not None:
+            self._outbox.flush()
+
+    def close(self, timeout: float = DEFAULT_CLOSE_TIMEOUT_SECONDS):
+        """
+        Post what is queued for up to timeout seconds, then stop the workers and close their connections.
+
+        Anything not posted by then, and outbox entries that haven't been replayed yet, are left in the
+        outbox for the next start. Submitting after close() raises ClientClosedError.
+        """
+        deadline = time.monotonic() + timeout
+        remaining = lambda: max(deadline - time.monotonic(), 0)
+        with self._threads_lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads, self._threads = self._threads, []
+        self._stopping.set()
+        if self._replay_thread is not None:
+            self._replay_thread.join(remaining())
+        for submission_queue in self._queues[:len(threads)]:
+            try:
+                submission_queue.put(_STOP, timeout=remaining())
+            except queue.Full:
+                pass
+        for thread in threads:
+            thread.join(remaining())
+        self._abandoned.set()
+        stuck = [thread.name for thread in threads + [self._replay_thread] if thread is not None and thread.is_alive()]
+        self._close_sessions()
+        if self._outbox is None:
+            return
+        if stuck:
+            # Those threads may still touch the outbox, so keep it open; deliveries so far are committed
+            logger.warning(f'Stopped waiting for {", ".join(stuck)} after {timeout}s; '
+                           f'{self._outbox.count_pending()} submissions are left in {self._outbox.filename}')
+            self._outbox.flush()
+        else:
+            self._outbox.close()
+            self._outbox = None
+
+    def _get_session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=self._pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            with self._metrics_lock:
+                self._sessions.append(session)
+                self._adapters.append(adapter)
+            self._local.session = session
+        return session
+
+    def get_connection_metrics(self) -> Dict[str, int]:
+        """How many requests were made, and how many of them needed a new connection."""
+        with self._metrics_lock:
+            adapters = list(self._adapters)
+            requests_made = self._closed_connection_counts['requests']
+            connections = self._closed_connection_counts['connections']
+        for adapter in adapters:
+            adapter_requests, adapter_connections = self._get_adapter_counts(adapter)
+            requests_made += adapter_requests
+            connections += adapter_connections
+        return {
+            'requests': requests_made,
+            'connections': connections,
+            'reused': requests_made - connections,
+        }
+
+    @staticmethod
+    def _get_adapter_counts(adapter: requests.adapters.HTTPAdapter):
+        requests_made = 0
+        connections = 0
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requests_made += pool.num_requests
+                connections += pool.num_connections
+        return requests_made, connections
+
+    def _close_sessions(self):
+        with self._metrics_lock:
+            sessions, self._sessions = self._sessions, []
+            adapters, self._adapters = self._adapters, []
+            for adapter in adapters:
+                adapter_requests, adapter_connections = self._get_adapter_counts(adapter)
+                self._closed_connection_counts['requests'] += adapter_requests
+                self._closed_connection_counts['connections'] += adapter_connections
+        for session in sessions:
+            session.close()
+        # Threads that make requests after this start over with a new session
+        self._local = threading.local()
 
     def _retry_post(self, endpoint: str, blob: Any, use_gzip=False):
         def _send_request() -> requests.Response:
@@ -37,8 +436,11 @@ class ApiClient:
             else:
                 args["json"] = blob
 
+            if self._abandoned.is_set():
+                # Not a ConnectionError, so retry_api_call stops retrying
+                raise ClientClosedError('ApiClient closed while retrying')
             logger.debug(f'Sending POST request: {args}')
-            return requests.post(**args)
+            return self._get_session().post(timeout=self._timeout, **args)
 
         def _validate_response(response: requests.Response) -> bool:
             logger.debug(f'{response.status_code} Response: {response.text}')
@@ -52,7 +454,7 @@ class ApiClient:
     def _retry_get(self, endpoint, params):
         def _send_request() -> requests.Response:
             logger.debug(f'Sending GET to {self.host}/{endpoint}: {params}')
-            return requests.get(f'{self.host}/{endpoint}', params=params)
+            return self._get_session().get(f'{self.host}/{endpoint}', params=params, timeout=self._timeout)
 
         def _validate_response(response: requests.Response) -> bool:
             logger.debug(f'{response.status_code} Response: {response.text}')
@@ -68,57 +470,3 @@ class ApiClient:
             endpoint='api/version_validation',
             params=params,
         )
-
-    def submit_collection(self, blob: Dict):
-        return self._retry_post(endpoint='collection', blob=blob)
-
-    def submit_deck_submission(self, blob: Dict):
-        return self._retry_post(endpoint='deck', blob=blob)
-
-    def submit_draft_pack(self, blob: Dict):
-        return self._retry_post(endpoint='pack', blob=blob)
-
-    def submit_draft_pick(self, blob: Dict):
-        return self._retry_post(endpoint='pick', blob=blob)
-
-    def submit_event_course_submission(self, blob: Dict):
-        return self._retry_post(endpoint='event_course', blob=blob)
-
-    def submit_event_ended(self, blob: Dict):
-        return self._retry_post(endpoint='event_ended', blob=blob)
-
-    def submit_event_submission(self, blob: Dict):
-        return self._retry_post(endpoint='event', blob=blob)
-
-    def submit_game_result(self, blob: Dict):
-        return self._retry_post(endpoint='game', blob=blob, use_gzip=True)
-
-    def submit_human_draft_pack(self, blob: Dict):
-        return self._retry_post(endpoint='human_draft_pack', blob=blob)
-
-    def submit_human_draft_pick(self, blob: Dict):
-        return self._retry_post(endpoint='human_draft_pick', blob=blob)
-
-    def submit_inventory(self, blob: Dict):
-        return self._retry_post(endpoint='inventory', blob=blob)
-
-    def submit_ongoing_events(self, blob: Dict):
-        return self._retry_post(endpoint='ongoing_events', blob=blob)
-
-    def submit_player_progress(self, blob: Dict):
-        return self._retry_post(endpoint='player_progress', blob=blob)
-
-    def submit_rank(self, blob: Dict):
-        return self._retry_post(endpoint='api/rank', blob=blob)
-
-    def submit_user(self, blob: Dict):
-        return self._retry_post(endpoint='api/account', blob=blob)
-
-    def submit_error_info(self, blob: Dict):
-        now = datetime.datetime.utcnow()
-        if self._last_error_posted_at > now - _ERROR_COOLDOWN:
-            logger.warning(f'Waiting to post another error; last message was sent too recently ({self._last_error_posted_at.isoformat()})')
-            return
-
-        self._last_error_posted_at = now
-        return self._retry_post(endpoint='api/client_errors', blob=blob, use_gzip=True)
@@ -0,0 +1,145 @@
+"""
+Processes archived Magic Arena logs in bulk, without the overlay.
+
+Each log is parsed by a headless Follower in a pool of processes, and everything the follower would
+have submitted is written to a JSONL file per log instead, one {"endpoint", "blob"} object per line.
+
+Run with e.g. `python batch_follower.py archive/ "backups/*/Player-prev.log" --output extracted`.
+"""
+import argparse
+import fnmatch
+import glob
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import api_client
+import mtga_follower
+from json_backend import AUTO_BACKEND, JSON_BACKENDS
+
+DEFAULT_LOG_PATTERN = 'Player*.log'
+
+
+class RecordingApiClient(api_client.ApiClient):
+    """Writes each submission as a line of JSON instead of sending it."""
+
+    def __init__(self, output_file):
+        # A single worker, so lines are written one at a time and in submission order
+        super().__init__(host='', workers=1)
+        self.output_file = output_file
+        self.submission_count = 0
+
+    def _retry_post(self, endpoint, blob, use_gzip=False):
+        self.output_file.write(json.dumps({'endpoint': endpoint, 'blob': blob}) + '\n')
+        self.submission_count += 1
+
+
+def find_log_files(paths, pattern=DEFAULT_LOG_PATTERN):
+    """
+    :param paths:   Log files, directories to search recursively for pattern, or globs of either.
+    :returns: Sorted list of log filenames, without duplicates.
+    """
+    filenames = set()
+    for path in paths:
+        for match in glob.glob(path, recursive=True) or [path]:
+            if os.path.isdir(match):
+                for root, _, files in os.walk(match):
+                    filenames.update(os.path.join(root, name) for name in fnmatch.filter(files, pattern))
+            elif os.path.isfile(match):
+                filenames.add(match)
+    return sorted(filenames)
+
+
+def get_output_filename(output_dir, log_filename):
+    """A name for the output of a log that doesn't collide with other logs of the same name."""
+    path = os.path.splitdrive(os.path.abspath(log_filename))[1].strip(os.sep)
+    return os.path.join(output_dir, path.replace(os.sep, '__') + '.jsonl')
+
+
+def process_log_file(log_filename, output_dir, json_backend=AUTO_BACKEND):
+    """
+    Parse a whole log with a headless Follower, recording its submissions.
+
+    :returns: (log size in bytes, number of submissions)
+    """
+    output_filename = get_output_filename(output_dir, log_filename)
+    temp_filename = output_filename + '.tmp'
+    with open(temp_filename, 'w') as output_file:
+        client = RecordingApiClient(output_file)
+        follower = mtga_follower.Follower(
+            token=None,
+            follower_thread=None,
+            host='',
+            debug_mode=False,
+            json_backend=json_backend,
+            headless=True,
+            client=client,
+        )
+        follower.max_entry_age_seconds = None
+        follower.parse_log(filename=log_filename, follow=False)
+        client.close()
+    os.replace(temp_filename, output_filename)
+    return os.path.getsize(log_filename), client.submission_count
+
+
+def _init_worker():
+    # Per-message progress logging from many processes at once is just noise
+    logging.getLogger('17Lands').setLevel(logging.WARNING)
+
+
+def process_log_files(log_filenames, output_dir, processes=None, json_backend=AUTO_BACKEND):
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    total_bytes = 0
+    total_submissions = 0
+    failures = 0
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker) as executor:
+        futures = {
+            executor.submit(process_log_file, log_filename, output_dir, json_backend): log_filename
+            for log_filename in log_filenames
+        }
+        for future in as_completed(futures):
+            log_filename = futures[future]
+            try:
+                size, submissions = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"Failed to process {log_filename}: {e}")
+                continue
+            total_bytes += size
+            total_submissions += submissions
+            print(f"{log_filename}: {submissions} submissions")
+
+    elapsed = time.perf_counter() - start
+    processed = len(log_filenames) - failures
+    print(f"Processed {processed} of {len(log_filenames)} logs ({total_bytes / 2**20:.1f} MiB, "
+          f"{total_submissions} submissions) in {elapsed:.1f}s: "
+          f"{processed / elapsed:.2f} files/s, {total_bytes / 2**20 / elapsed:.2f} MiB/s")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Process archived MTGA logs in bulk')
+    parser.add_argument('paths', nargs='+',
+        help='Log files, directories to search for logs, or globs of either')
+    parser.add_argument('--output', required=True,
+        help='Directory to write one JSONL file of submissions per log to')
+    parser.add_argument('--pattern', default=DEFAULT_LOG_PATTERN,
+        help=f'Filename pattern of logs to look for in directories (default {DEFAULT_LOG_PATTERN})')
+    parser.add_argument('--processes', type=int, default=None,
+        help='Number of worker processes (default is the number of CPUs)')
+    parser.add_argument('--json_backend', choices=(AUTO_BACKEND, ) + JSON_BACKENDS, default=AUTO_BACKEND)
+    args = parser.parse_args()
+
+    log_filenames = find_log_files(args.paths, args.pattern)
+    if not log_filenames:
+        print(f"No logs found in {args.paths}")
+        return 1
+    return 1 if process_log_files(log_filenames, args.output, args.processes, args.json_backend) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
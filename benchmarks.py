@@ -0,0 +1,318 @@
+"""
+Benchmarks for the hot paths of the overlay.
+
+Run a single benchmark with e.g. `python benchmarks.py win_rates --rows 200000 --cards 300`.
+"""
+import argparse
+import gzip
+import os
+import tempfile
+import time
+import types
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import requests
+
+import api_client
+import carddata
+import submission_sinks
+
+
+def _time_call(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def make_synthetic_game_data(rows, cards, setsymbol="BLB", seed=0):
+    """Build a game_data style DataFrame and a matching cards DataFrame."""
+    rng = np.random.default_rng(seed)
+    names = [f"Card {i}" for i in range(cards)]
+    columns = {'won': rng.random(rows) < 0.55}
+    for name in names:
+        opening_hand = (rng.random(rows) < 0.05).astype(np.int64)
+        drawn = (rng.random(rows) < 0.10).astype(np.int64)
+        drawn[rng.random(rows) < 0.01] = 2
+        columns["opening_hand_" + name] = opening_hand
+        columns["drawn_" + name] = drawn
+    game_df = pd.DataFrame(columns)
+    cards_df = pd.DataFrame({
+        'id': np.arange(cards) + 90000,
+        'expansion': setsymbol,
+        'name': names,
+        'rarity': 'common',
+    })
+    return game_df, cards_df
+
+
+def _legacy_filter_game_data_to_set(setsymbol, game_df, cards_df):
+    """The per-card loop filter_game_data_to_set used before the vectorized engine."""
+    cards_in_set_df = cards_df[cards_df['expansion'] == setsymbol].copy()
+    cards_in_set_df['GDWR'] = None
+    cards_in_set_df['OHWR'] = None
+    cards_in_set_df['GIHWR'] = None
+    for card in cards_in_set_df['name']:
+        drawn_col_name = "drawn_" + card
+        opening_hand_col_name = "opening_hand_" + card
+        if drawn_col_name in game_df.columns and opening_hand_col_name in game_df.columns:
+            drawn_count = game_df[drawn_col_name].sum()
+            drawn_game_won_count = game_df[(game_df[drawn_col_name] == 1) & (game_df['won'] == True)].shape[0]
+            GDWR = drawn_game_won_count / drawn_count if drawn_count > 0 else None
+            opening_hand_count = game_df[opening_hand_col_name].sum()
+            opening_hand_game_won_count = game_df[(game_df[opening_hand_col_name] == 1) & (game_df['won'] == True)].shape[0]
+            OHWR = opening_hand_game_won_count / opening_hand_count if opening_hand_count > 0 else None
+            GIH_count = ((game_df[drawn_col_name] == 1) | (game_df[opening_hand_col_name] == 1)).sum()
+            GIH_game_won_count = game_df[((game_df[drawn_col_name] == 1) | (game_df[opening_hand_col_name] == 1)) & (game_df['won'] == True)].shape[0]
+            GIHWR = GIH_game_won_count / GIH_count if GIH_count > 0 else None
+            cards_in_set_df.loc[cards_in_set_df['name'] == card, 'GDWR'] = GDWR
+            cards_in_set_df.loc[cards_in_set_df['name'] == card, 'OHWR'] = OHWR
+            cards_in_set_df.loc[cards_in_set_df['name'] == card, 'GIHWR'] = GIHWR
+    return cards_in_set_df
+
+
+def benchmark_win_rates(rows, cards):
+    game_df, cards_df = make_synthetic_game_data(rows, cards)
+
+    legacy_df, legacy_seconds = _time_call(_legacy_filter_game_data_to_set, "BLB", game_df, cards_df)
+    vectorized_df, vectorized_seconds = _time_call(carddata.filter_game_data_to_set, "BLB", game_df, cards_df)
+
+    for column in carddata.WIN_RATE_COLUMNS:
+        np.testing.assert_allclose(
+            legacy_df[column].astype(np.float64).to_numpy(),
+            vectorized_df[column].to_numpy(),
+        )
+
+    print(f"win rates for {rows} games x {cards} cards")
+    print(f"  per-card loop: {legacy_seconds:.3f}s")
+    print(f"  vectorized:    {vectorized_seconds:.3f}s ({legacy_seconds / vectorized_seconds:.1f}x faster)")
+
+
+def write_synthetic_game_data_dump(path, rows, cards):
+    """Write a gzipped game_data dump with the full 17lands column layout."""
+    game_df, _ = make_synthetic_game_data(rows, cards)
+    rng = np.random.default_rng(1)
+    dump_df = pd.DataFrame({
+        'expansion': 'BLB',
+        'event_type': 'PremierDraft',
+        'draft_id': [f"{i:032x}" for i in range(rows)],
+        'draft_time': '2024-08-01 12:00:00',
+        'game_time': pd.date_range('2024-08-01', periods=rows, freq='min').strftime('%Y-%m-%d %H:%M:%S'),
+        'rank': rng.choice(['bronze', 'silver', 'gold', 'platinum', 'diamond', 'mythic'], rows),
+        'main_colors': rng.choice(['WU', 'UB', 'BR', 'RG', 'GW', 'WUB'], rows),
+        'splash_colors': rng.choice(['', 'R', 'G'], rows),
+        'won': game_df['won'],
+    })
+    card_columns = {}
+    for name in game_df.columns.drop('won').str.replace('^(drawn|opening_hand)_', '', regex=True).unique():
+        for family in ('opening_hand_', 'drawn_', 'tutored_', 'deck_', 'sideboard_'):
+            card_columns[family + name] = game_df.get(family + name, 0)
+    dump_df = pd.concat([dump_df, pd.DataFrame(card_columns)], axis=1)
+    with gzip.open(path, 'wt') as f:
+        dump_df.to_csv(f, index=False)
+
+
+def _read_game_data_dump(path, read_options):
+    with open(path, 'rb') as raw:
+        response = types.SimpleNamespace(raw=raw)
+        chunks = list(carddata.iter_gzipped_csv_chunks(response, read_options=read_options))
+    return sum(int(chunk.memory_usage(deep=True).sum()) for chunk in chunks)
+
+
+def benchmark_game_data_read(rows, cards):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'game_data.csv.gz')
+        write_synthetic_game_data_dump(path, rows, cards)
+
+        full_bytes, full_seconds = _time_call(_read_game_data_dump, path, None)
+        pruned_bytes, pruned_seconds = _time_call(_read_game_data_dump, path, carddata.get_game_data_read_options)
+
+    print(f"game_data read for {rows} games x {cards} cards")
+    print(f"  all columns:    {full_seconds:.3f}s, {full_bytes / 2**20:.1f} MiB")
+    print(f"  schema-aware:   {pruned_seconds:.3f}s, {pruned_bytes / 2**20:.1f} MiB "
+          f"({full_seconds / pruned_seconds:.1f}x faster, {full_bytes / pruned_bytes:.1f}x smaller)")
+
+
+def _read_log_lines(path):
+    with open(path, 'rb') as f:
+        return [line.replace(b'\r\n', b'\n').decode('utf-8', errors='replace') for line in f]
+
+
+def _legacy_classify_log_lines(follower, lines):
+    """The regex chain __append_line ran on every line before the single-pass classifier."""
+    log_starts = 0
+    for line in lines:
+        line.startswith('DETAILED LOGS: DISABLED')
+        line.startswith('DETAILED LOGS: ENABLED')
+        if not follower.ACCOUNT_INFO_REGEX.match(line):
+            follower.MATCH_ACCOUNT_INFO_REGEX.match(line)
+        follower.TIMESTAMP_REGEX.match(line)
+        if follower.LOG_START_REGEX_UNTIMED.match(line):
+            log_starts += 1
+            follower.LOG_START_REGEX_TIMED.match(line)
+    return log_starts
+
+
+def _classify_log_lines(follower, lines):
+    log_starts = 0
+    for line in lines:
+        line_kind = follower.classify_log_line(line)
+        if line_kind == follower.LINE_CONTINUATION:
+            continue
+        if 'Match' in line or 'Updated account' in line:
+            if not follower.ACCOUNT_INFO_REGEX.match(line):
+                follower.MATCH_ACCOUNT_INFO_REGEX.match(line)
+        if line_kind == follower.LINE_TIMESTAMP:
+            follower.TIMESTAMP_REGEX.match(line)
+        elif line_kind == follower.LINE_LOG_START:
+            log_starts += 1
+            follower.LOG_START_REGEX_TIMED.match(line)
+    return log_starts
+
+
+def benchmark_log_lines(path):
+    import mtga_follower
+
+    lines = _read_log_lines(path)
+    legacy_starts, legacy_seconds = _time_call(_legacy_classify_log_lines, mtga_follower, lines)
+    classified_starts, classified_seconds = _time_call(_classify_log_lines, mtga_follower, lines)
+    assert legacy_starts == classified_starts
+
+    kinds = Counter(mtga_follower.classify_log_line(line) for line in lines)
+    print(f"line classification for {len(lines)} lines of {path}")
+    print("  " + ", ".join(f"{kind}: {count}" for kind, count in kinds.most_common()))
+    print(f"  regex chain:  {legacy_seconds:.3f}s")
+    print(f"  single pass:  {classified_seconds:.3f}s ({legacy_seconds / classified_seconds:.1f}x faster)")
+
+
+def _read_log_json_blobs(path, marker):
+    """The JSON text of each complete message in a Player.log containing marker."""
+    import mtga_follower
+
+    entries = []
+    for line in _read_log_lines(path):
+        if mtga_follower.classify_log_line(line) == mtga_follower.LINE_LOG_START or not entries:
+            entries.append([])
+        entries[-1].append(line)
+
+    blobs = []
+    for entry in entries:
+        full_log = ''.join(entry)
+        log_start = mtga_follower.LOG_START_REGEX_TIMED.match(full_log) or mtga_follower.LOG_START_REGEX_UNTIMED.match(full_log)
+        match = mtga_follower.JSON_START_REGEX.search(full_log, log_start.end() if log_start else 0)
+        if match and marker in full_log:
+            blobs.append(full_log[match.start():])
+    return blobs
+
+
+def _decode_all(decoder, blobs):
+    return [decoder.raw_decode(blob)[0] for blob in blobs]
+
+
+def benchmark_json_decode(path, marker):
+    import json_backend
+
+    blobs = _read_log_json_blobs(path, marker)
+    megabytes = sum(len(blob) for blob in blobs) / 2**20
+    print(f"decoding {len(blobs)} messages containing {marker} ({megabytes:.1f} MiB) from {path}")
+
+    expected, baseline_seconds = _time_call(_decode_all, json_backend.get_json_decoder('json'), blobs)
+    print(f"  json:   {baseline_seconds:.3f}s")
+    for backend in json_backend.JSON_BACKENDS[:-1]:
+        try:
+            decoder = json_backend.get_json_decoder(backend)
+        except ImportError:
+            print(f"  {backend}: not installed")
+            continue
+        decoded, seconds = _time_call(_decode_all, decoder, blobs)
+        assert decoded == expected
+        print(f"  {backend}: {seconds:.3f}s ({baseline_seconds / seconds:.1f}x faster)")
+
+
+class _UnpooledApiClient(api_client.ApiClient):
+    """Makes every request on a new session, like the module-level requests.post did."""
+
+    def _get_session(self):
+        return requests.Session()
+
+
+def _submit_draft(client, picks):
+    for pick_number in range(picks):
+        draft = {'event_name': 'PremierDraft_BLB', 'draft_id': 'draft-0', 'pack_number': 0, 'pick_number': pick_number}
+        client.submit_draft_pack({**draft, 'card_ids': list(range(90000, 90014))})
+        client.submit_draft_pick({**draft, 'card_id': 90000})
+    client.flush()
+
+
+def benchmark_submissions(picks):
+    import standin_server
+
+    print(f"submitting {picks} packs and picks to a local stand-in server")
+    clients = (
+        ('new connection each', _UnpooledApiClient, {}),
+        ('pooled sessions', api_client.ApiClient, {}),
+        ('batched', api_client.ApiClient, {'batch_url_template': api_client.DEFAULT_BATCH_URL_TEMPLATE}),
+    )
+    for label, client_class, client_args in clients:
+        server = standin_server.StandInServer()
+        server.start_in_background()
+        client = client_class(server.url, **client_args)
+        _, seconds = _time_call(_submit_draft, client, picks)
+        client_connections = client.get_connection_metrics()
+        client.close()
+        server.shutdown()
+        server.server_close()
+        stats = server.stats.snapshot()
+        submissions = sum(stats['records'].values())
+        print(f"  {label}: {seconds:.3f}s ({submissions / seconds:.0f} submissions/s), "
+              f"{sum(stats['requests'].values())} requests, {stats['bytes_received'] / 1024:.0f} KiB, "
+              f"{stats['connections']} connections ({client_connections['reused']} requests reused one)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        sink = submission_sinks.SqliteSink(os.path.join(directory, 'submissions.sqlite3'))
+        _, seconds = _time_call(_submit_draft, sink, picks)
+        metrics = sink.get_metrics()
+        sink.close()
+    print(f"  local sqlite sink: {seconds:.3f}s ({metrics['written'] / seconds:.0f} submissions/s), "
+          f"{metrics['transactions']} transactions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MTGA overlay benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    win_rates_parser = subparsers.add_parser('win_rates', help='Per-card win rate computation')
+    win_rates_parser.add_argument('--rows', type=int, default=100000)
+    win_rates_parser.add_argument('--cards', type=int, default=300)
+
+    game_data_read_parser = subparsers.add_parser('game_data_read', help='Parsing a game_data dump')
+    game_data_read_parser.add_argument('--rows', type=int, default=50000)
+    game_data_read_parser.add_argument('--cards', type=int, default=300)
+
+    log_lines_parser = subparsers.add_parser('log_lines', help='Classifying the lines of a Player.log')
+    log_lines_parser.add_argument('log_file', help='Path to a Player.log')
+
+    json_decode_parser = subparsers.add_parser('json_decode', help='Decoding the JSON of Player.log messages')
+    json_decode_parser.add_argument('log_file', help='Path to a Player.log')
+    json_decode_parser.add_argument('--marker', default='greToClientEvent',
+        help='Only decode messages containing this text (GRE messages by default)')
+
+    submissions_parser = subparsers.add_parser('submissions', help='Posting submissions to a local stand-in server, or storing them locally')
+    submissions_parser.add_argument('--picks', type=int, default=500)
+
+    args = parser.parse_args()
+    if args.benchmark == 'win_rates':
+        benchmark_win_rates(args.rows, args.cards)
+    elif args.benchmark == 'game_data_read':
+        benchmark_game_data_read(args.rows, args.cards)
+    elif args.benchmark == 'log_lines':
+        benchmark_log_lines(args.log_file)
+    elif args.benchmark == 'json_decode':
+        benchmark_json_decode(args.log_file, args.marker)
+    elif args.benchmark == 'submissions':
+        benchmark_submissions(args.picks)
+
+
+if __name__ == '__main__':
+    main()
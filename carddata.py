@@ -1,15 +1,170 @@
 import pandas as pd
-import io
+import numpy as np
 import os
 import requests
 import gzip
 import datetime
 import json
+import csv
+import time
+import threading
+import concurrent.futures
 
 card_csv_url = "https://17lands-public.s3.amazonaws.com/analysis_data/cards/cards.csv"
 #url = "https://17lands-public.s3.amazonaws.com/analysis_data/game_data/game_data_public.BLB.PremierDraft.csv.gz"
 #91603
 
+CACHE_SCHEMA_VERSION = 1
+CACHE_SCHEMA_FILE = "schema.json"
+
+def get_cache_path(name):
+    return name+".cache"
+
+def _is_list_column(series):
+    return any(isinstance(value, (list, tuple, np.ndarray)) for value in series)
+
+def save_columnar_cache(df, cache_path, metadata=None):
+    """
+    Write a DataFrame as a directory of .npy files, one per column, plus a schema.json.
+
+    Numeric columns keep their dtype, text columns are stored as fixed width unicode with a
+    null mask, and list columns are stored as flattened values plus row offsets. The schema is
+    written last, so a cache without one is treated as missing.
+
+    :param metadata: Optional JSON serializable dict stored in the schema next to the columns.
+    """
+    os.makedirs(cache_path, exist_ok=True)
+    schema_file = os.path.join(cache_path, CACHE_SCHEMA_FILE)
+    if os.path.exists(schema_file):
+        os.remove(schema_file)
+
+    columns = []
+    for index, column in enumerate(df.columns):
+        series = df[column]
+        file_stem = os.path.join(cache_path, str(index))
+        if series.dtype.kind in 'biuf':
+            values = series.to_numpy()
+            np.save(file_stem+".npy", values)
+            columns.append({'name': column, 'kind': 'numeric', 'dtype': values.dtype.str})
+        elif _is_list_column(series):
+            nulls = np.array([value is None or (isinstance(value, float) and np.isnan(value)) for value in series], dtype=bool)
+            rows = [[] if null else list(value) for value, null in zip(series, nulls)]
+            offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(row) for row in rows])
+            values = np.array([str(value) for row in rows for value in row], dtype=str)
+            np.save(file_stem+".npy", values)
+            np.save(file_stem+".offsets.npy", offsets)
+            np.save(file_stem+".null.npy", nulls)
+            columns.append({'name': column, 'kind': 'list', 'dtype': values.dtype.str})
+        else:
+            nulls = series.isna().to_numpy()
+            values = np.array(['' if null else str(value) for value, null in zip(series, nulls)], dtype=str)
+            np.save(file_stem+".npy", values)
+            np.save(file_stem+".null.npy", nulls)
+            columns.append({'name': column, 'kind': 'str', 'dtype': values.dtype.str})
+
+    with open(schema_file, 'w') as f:
+        json.dump({'version': CACHE_SCHEMA_VERSION, 'rows': int(df.shape[0]), 'columns': columns,
+                   'metadata': metadata or {}}, f)
+
+def _read_cache_schema(cache_path):
+    schema_file = os.path.join(cache_path, CACHE_SCHEMA_FILE)
+    if not os.path.exists(schema_file):
+        return None
+    with open(schema_file, 'r') as f:
+        schema = json.load(f)
+    if schema.get('version') != CACHE_SCHEMA_VERSION:
+        print(f"Cache {cache_path} has schema version {schema.get('version')}, expected {CACHE_SCHEMA_VERSION}")
+        return None
+    return schema
+
+def load_cache_metadata(cache_path):
+    schema = _read_cache_schema(cache_path)
+    return None if schema is None else schema.get('metadata', {})
+
+def load_columnar_cache(cache_path):
+    """
+    Load a cache written by save_columnar_cache, or return None if it is missing or from another schema version.
+
+    Numeric columns stay backed by their memory-mapped .npy files (copy-on-write, so writing to the
+    frame never changes the cache). Text and list columns are read into Python objects.
+    """
+    schema = _read_cache_schema(cache_path)
+    if schema is None:
+        return None
+
+    data = {}
+    for index, column in enumerate(schema['columns']):
+        file_stem = os.path.join(cache_path, str(index))
+        if column['kind'] == 'numeric':
+            values = np.load(file_stem+".npy", mmap_mode='c')
+            data[column['name']] = pd.Series(values, dtype=column['dtype'], copy=False)
+            continue
+        values = np.load(file_stem+".npy")
+        if column['kind'] == 'list':
+            offsets = np.load(file_stem+".offsets.npy")
+            nulls = np.load(file_stem+".null.npy")
+            items = values.tolist()
+            data[column['name']] = pd.Series([None if nulls[row] else items[offsets[row]:offsets[row + 1]]
+                                              for row in range(schema['rows'])], dtype=object)
+        else:
+            nulls = np.load(file_stem+".null.npy")
+            data[column['name']] = pd.Series(np.where(nulls, None, values.astype(object)), dtype=object)
+    # copy=False keeps each numeric column in its own block on its memory map instead of consolidating them
+    return pd.DataFrame(data, columns=[column['name'] for column in schema['columns']], copy=False)
+
+DOWNLOAD_MANIFEST_FILE = "download_manifest.json"
+_download_manifest_lock = threading.Lock()
+
+def load_download_manifest():
+    if not os.path.exists(DOWNLOAD_MANIFEST_FILE):
+        return {}
+    try:
+        with open(DOWNLOAD_MANIFEST_FILE, 'r') as f:
+            return json.load(f)
+    except ValueError:
+        print(f"Ignoring unreadable {DOWNLOAD_MANIFEST_FILE}")
+        return {}
+
+def record_download_validators(url, response):
+    """Remember the ETag/Last-Modified of a response whose content has been fully processed and cached."""
+    with _download_manifest_lock:
+        manifest = load_download_manifest()
+        manifest[url] = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'downloaded_at': datetime.datetime.now().isoformat(),
+        }
+        temp_file = DOWNLOAD_MANIFEST_FILE+".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(temp_file, DOWNLOAD_MANIFEST_FILE)
+
+def open_url_if_modified(url, use_validators=True):
+    """
+    Issue a streamed GET for url, conditional on the validators stored in the download manifest.
+
+    :param use_validators: Send If-None-Match/If-Modified-Since; only do this when the result of the
+                           previous download is still cached locally.
+
+    :returns: The open 200 response, or None if the server answered 304 Not Modified.
+    """
+    headers = {}
+    validators = load_download_manifest().get(url, {}) if use_validators else {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    response = requests.get(url, headers=headers, stream=True)
+    if response.status_code == 304:
+        response.close()
+        return None
+    if response.status_code != 200:
+        response.close()
+        raise Exception(f"HTTP error {response.status_code}: {response.reason}")
+    return response
+
 def downloadMTGJsonDataForSet(setsymbol):
     file_path = setsymbol+".json"
     if os.path.exists(file_path):
@@ -25,9 +180,9 @@ def downloadMTGJsonDataForSet(setsymbol):
         return data
 
 def GetDataForSetFromMTGJson(setsymbol):
-    file_name = setsymbol+"_MTGJson.csv"
-    if os.path.exists(file_name):
-        card_data = pd.read_csv(file_name)
+    cache_path = get_cache_path(setsymbol+"_MTGJson")
+    card_data = load_columnar_cache(cache_path)
+    if card_data is not None:
         return card_data
     else:
         data = downloadMTGJsonDataForSet(setsymbol)
@@ -52,13 +207,84 @@ def GetDataForSetFromMTGJson(setsymbol):
                 }
                 processed_cards.append(processed_card)
         df = pd.DataFrame(processed_cards, columns=columns)       
-        df.to_csv(file_name, index=False) 
+        df['id'] = df['id'].astype(np.int64)
+        df['mana_value'] = df['mana_value'].astype(np.float64)
+        save_columnar_cache(df, cache_path)
         return df
 
 
-def get_card_data():
-    cards_df = pd.read_csv(card_csv_url)
-    return cards_df
+CARD_DATA_CACHE_DIR = "cards"
+CARD_DATA_INDEX_FILE = os.path.join(CARD_DATA_CACHE_DIR, "index.json")
+_card_data_lock = threading.Lock()
+
+def get_card_data_slice_path(expansion):
+    return get_cache_path(os.path.join(CARD_DATA_CACHE_DIR, expansion))
+
+def load_card_data_index():
+    """
+    Load the index of the local cards.csv cache.
+
+    :returns: {'ids': {arena id: expansion}, 'names': {name: [arena ids]}}, or None if there is no cache yet.
+    """
+    if not os.path.exists(CARD_DATA_INDEX_FILE):
+        return None
+    with open(CARD_DATA_INDEX_FILE, 'r') as f:
+        return json.load(f)
+
+def _save_card_data_partitions(cards_df):
+    """Split cards.csv into one columnar cache per expansion and write the id/name index for them."""
+    os.makedirs(CARD_DATA_CACHE_DIR, exist_ok=True)
+    if os.path.exists(CARD_DATA_INDEX_FILE):
+        os.remove(CARD_DATA_INDEX_FILE)
+
+    index = {'ids': {}, 'names': {}}
+    for expansion, expansion_df in cards_df.groupby('expansion', sort=False):
+        save_columnar_cache(expansion_df.reset_index(drop=True), get_card_data_slice_path(str(expansion)))
+        for card_id, name in zip(expansion_df['id'], expansion_df['name']):
+            index['ids'][str(card_id)] = str(expansion)
+            index['names'].setdefault(name, []).append(int(card_id))
+
+    with open(CARD_DATA_INDEX_FILE, 'w') as f:
+        json.dump(index, f)
+    return index
+
+def refresh_card_data():
+    """Download cards.csv again if it changed upstream (or was never cached) and re-partition it."""
+    index = load_card_data_index()
+    try:
+        response = open_url_if_modified(card_csv_url, use_validators=index is not None)
+    except Exception as e:
+        print(f"Could not check cards.csv: {e}")
+        return index
+
+    if response is None:
+        return index
+
+    with response:
+        response.raw.decode_content = True
+        cards_df = pd.read_csv(response.raw)
+    index = _save_card_data_partitions(cards_df)
+    record_download_validators(card_csv_url, response)
+    print(f"Cached cards.csv for {len(index['ids'])} cards")
+    return index
+
+def get_card_data(setsymbol=None):
+    """
+    Return the 17lands cards.csv rows, from the local per-expansion cache after a conditional refresh.
+
+    :param setsymbol: Only load this expansion's slice. All expansions are loaded when None.
+    """
+    with _card_data_lock:
+        index = refresh_card_data()
+        if index is None:
+            return None
+
+        expansions = [setsymbol] if setsymbol is not None else sorted(set(index['ids'].values()))
+        slices = [load_columnar_cache(get_card_data_slice_path(expansion)) for expansion in expansions]
+        slices = [expansion_df for expansion_df in slices if expansion_df is not None]
+    if not slices:
+        return pd.DataFrame(columns=['id', 'expansion', 'name'])
+    return pd.concat(slices, ignore_index=True) if len(slices) > 1 else slices[0]
 
 def get_name_from_id(cards_df, card_id):
     # Try to find the card with the given ID
@@ -70,32 +296,101 @@ def get_name_from_id(cards_df, card_id):
     else:
         return f"No card found with ID: {card_id}"
 
-def get_game_data(setsymbol, draftformat = "PremierDraft"):
-    url = "https://17lands-public.s3.amazonaws.com/analysis_data/game_data/game_data_public."+setsymbol+"."+draftformat+".csv.gz"
+GAME_DATA_CHUNK_ROWS = 50000
+GAME_DATA_CARD_COLUMN_PREFIXES = ("drawn_", "opening_hand_")
+GAME_DATA_COLUMN_DTYPES = {
+    'won': bool,
+    'main_colors': 'category',
+    'splash_colors': 'category',
+    'game_time': object,
+}
+
+def get_game_data_read_options(columns):
+    """
+    Pick the game_data columns the win rate engine uses and the dtypes to parse them with.
+
+    Only drawn_/opening_hand_ counts (as int8) and a few metadata columns are read; the
+    tutored_/deck_/sideboard_ families and the remaining metadata are skipped while parsing.
+    """
+    dtype = {}
+    for column in columns:
+        if column.startswith(GAME_DATA_CARD_COLUMN_PREFIXES):
+            dtype[column] = np.int8
+        elif column in GAME_DATA_COLUMN_DTYPES:
+            dtype[column] = GAME_DATA_COLUMN_DTYPES[column]
+    if 'game_time' not in dtype and 'draft_time' in columns:
+        dtype['draft_time'] = object
+    return {'usecols': list(dtype), 'dtype': dtype}
+
+def get_game_data_url(setsymbol, draftformat = "PremierDraft"):
+    return "https://17lands-public.s3.amazonaws.com/analysis_data/game_data/game_data_public."+setsymbol+"."+draftformat+".csv.gz"
+
+def get_win_counts_cache_path(setsymbol, draftformat = "PremierDraft"):
+    # Renamed when splashes became their own axis, so counts that folded them into the archetype get rebuilt
+    return get_cache_path(setsymbol+"_"+draftformat+"_archetype_splash_counts")
+
+def load_archetype_win_counts(setsymbol, draftformat = "PremierDraft"):
+    """Load the stored per card and archetype counts for a set, e.g. to switch the overlay's color filter."""
+    counts_df = load_columnar_cache(get_win_counts_cache_path(setsymbol, draftformat))
+    if counts_df is None:
+        return None
+    return counts_df.set_index(['name', 'archetype', 'splash'])
+
+def update_game_win_counts(setsymbol, draftformat = "PremierDraft", response=None):
+    """
+    Fold the rows added to a set's game_data dump since the last refresh into its stored win counts.
+
+    The per card and archetype counts are kept in a columnar cache together with the latest
+    game_time already counted, so only newer rows are aggregated and then added to the stored totals.
+    """
+    cache_path = get_win_counts_cache_path(setsymbol, draftformat)
+    stored_counts_df = load_archetype_win_counts(setsymbol, draftformat)
+    watermark = None
+    if stored_counts_df is not None:
+        watermark = load_cache_metadata(cache_path).get('watermark')
+
     try:
-        game_df = load_gzipped_csv_from_url(url)
-        return game_df        
+        if response is None:
+            chunks = iter_gzipped_csv_chunks_from_url(get_game_data_url(setsymbol, draftformat),
+                                                      read_options=get_game_data_read_options)
+        else:
+            chunks = iter_gzipped_csv_chunks(response, read_options=get_game_data_read_options)
+        new_counts_df, watermark = accumulate_new_card_win_counts(chunks, watermark)
     except Exception as e:
-        print(f"An error occurred: {e}")    
+        print(f"An error occurred: {e}")
+        return None
 
-def load_gzipped_csv_from_url(url):
-    # Send a GET request to the URL
-    response = requests.get(url)
-    
-    # Check if the request was successful
-    if response.status_code == 200:
-        # Decompress the gzipped content
-        decompressed_content = gzip.decompress(response.content)
-        
-        # Create a StringIO object from the decompressed content
-        csv_file = io.StringIO(decompressed_content.decode('utf-8'))
-        
-        # Read the CSV file into a pandas DataFrame
-        df = pd.read_csv(csv_file)
-        
-        return df
-    else:
-        raise Exception(f"HTTP error {response.status_code}: {response.reason}")
+    if new_counts_df is None:
+        print(f"No new games for {setsymbol} since {watermark and watermark['value']}")
+        return stored_counts_df
+
+    counts_df = merge_card_win_counts(stored_counts_df, new_counts_df)
+    save_columnar_cache(counts_df.reset_index(), cache_path, metadata={'watermark': watermark})
+    return counts_df
+
+def iter_gzipped_csv_chunks(response, chunksize=GAME_DATA_CHUNK_ROWS, read_options=None, **read_csv_kwargs):
+    """
+    Yield a gzipped CSV from a streamed response as DataFrames of at most chunksize rows.
+
+    The body is read off the socket and gunzipped incrementally, so only the chunk
+    being parsed is ever held in memory.
+
+    :param read_options: Optional function taking the header's column names and returning extra
+                         read_csv arguments (e.g. get_game_data_read_options), applied before parsing.
+    """
+    with gzip.GzipFile(fileobj=response.raw) as csv_file:
+        if read_options is not None:
+            columns = next(csv.reader([csv_file.readline().decode('utf-8')]))
+            read_csv_kwargs = {'header': None, 'names': columns, **read_options(columns), **read_csv_kwargs}
+        with pd.read_csv(csv_file, chunksize=chunksize, **read_csv_kwargs) as reader:
+            for chunk in reader:
+                yield chunk
+
+def iter_gzipped_csv_chunks_from_url(url, chunksize=GAME_DATA_CHUNK_ROWS, read_options=None, **read_csv_kwargs):
+    with requests.get(url, stream=True) as response:
+        if response.status_code != 200:
+            raise Exception(f"HTTP error {response.status_code}: {response.reason}")
+        yield from iter_gzipped_csv_chunks(response, chunksize, read_options, **read_csv_kwargs)
 
 
 # expansion
@@ -124,64 +419,280 @@ def load_gzipped_csv_from_url(url):
 #deck_Bark-Knuckle Boxer
 #sideboard_Bark-Knuckle Boxer
 
+WIN_RATE_COLUMNS = ['GDWR', 'OHWR', 'GIHWR']
+WIN_COUNT_COLUMNS = ['drawn_count', 'drawn_won', 'opening_hand_count', 'opening_hand_won', 'GIH_count', 'GIH_won']
+WIN_COUNT_BLOCK_ROWS = 65536
+
+def get_card_names_from_game_columns(columns):
+    # Cards are only rated when the dump has both a drawn_ and an opening_hand_ column for them
+    column_set = set(columns)
+    return [column[len("drawn_"):] for column in columns
+            if column.startswith("drawn_") and "opening_hand_" + column[len("drawn_"):] in column_set]
+
+def compute_card_win_counts(game_df, card_names=None):
+    """
+    Count games and wins per card for drawn, opening hand and games in hand (GIH).
+
+    All drawn_/opening_hand_ columns are pulled into one numeric block and every card is
+    counted at once with dot products against the won vector, working through the rows in
+    fixed size blocks so the temporary matrices stay small.
+
+    :param game_df:    17lands game_data rows.
+    :param card_names: Cards to count, defaults to every card with columns in game_df.
+
+    :returns: DataFrame indexed by card name with one int64 column per WIN_COUNT_COLUMNS entry.
+    """
+    if card_names is None:
+        card_names = get_card_names_from_game_columns(game_df.columns)
+    card_names = list(dict.fromkeys(card_names))
+    card_count = len(card_names)
+    block_columns = ["drawn_" + card for card in card_names] + ["opening_hand_" + card for card in card_names]
+    counts = np.zeros((card_count, len(WIN_COUNT_COLUMNS)), dtype=np.int64)
+
+    for start in range(0, game_df.shape[0], WIN_COUNT_BLOCK_ROWS):
+        rows = game_df.iloc[start:start + WIN_COUNT_BLOCK_ROWS]
+        block = rows[block_columns].to_numpy(dtype=np.float32)
+        won = rows['won'].to_numpy(dtype=np.float32)
+        hits = (block == 1).astype(np.float32)
+        gih_hits = np.maximum(hits[:, :card_count], hits[:, card_count:])
+
+        totals = block.sum(axis=0, dtype=np.float64)
+        won_totals = won @ hits
+        counts[:, 0] += totals[:card_count].astype(np.int64)
+        counts[:, 1] += won_totals[:card_count].astype(np.int64)
+        counts[:, 2] += totals[card_count:].astype(np.int64)
+        counts[:, 3] += won_totals[card_count:].astype(np.int64)
+        counts[:, 4] += gih_hits.sum(axis=0, dtype=np.float64).astype(np.int64)
+        counts[:, 5] += (won @ gih_hits).astype(np.int64)
+
+    return pd.DataFrame(counts, index=pd.Index(card_names, name='name'), columns=WIN_COUNT_COLUMNS)
+
+COLORS = "WUBRG"
+# Archetypes are WUBRG bitmasks: index 0 is colorless/unknown, then every mono, pair, shard/wedge, 4c and 5c
+ARCHETYPES = [''.join(color for bit, color in enumerate(COLORS) if mask & (1 << bit)) for mask in range(1 << len(COLORS))]
+ARCHETYPE_COUNT = len(ARCHETYPES)
+# Whether the deck splashed, as a separate axis so e.g. WU splashing R still counts as WU
+SPLASHES = [False, True]
+
+def get_archetype(colors):
+    """Normalize a color string in any order (e.g. 'GW') to its ARCHETYPES entry ('WG')."""
+    return ''.join(color for color in COLORS if color in colors.upper())
+
+def _get_color_column(game_df, column):
+    if column not in game_df.columns:
+        return pd.Series('', index=game_df.index)
+    return game_df[column].astype(object).fillna('').astype(str)
+
+def get_archetype_codes(game_df):
+    """Index into ARCHETYPES for every game, from the deck's main colors only."""
+    unique_codes, unique_colors = pd.factorize(_get_color_column(game_df, 'main_colors'))
+    archetype_codes = np.array([ARCHETYPES.index(get_archetype(value)) for value in unique_colors], dtype=np.int64)
+    return archetype_codes[unique_codes]
+
+def get_splash_flags(game_df):
+    """Whether every game's deck splashed any colors."""
+    return (_get_color_column(game_df, 'splash_colors') != '').to_numpy()
+
+def compute_card_archetype_counts(game_df, card_names=None):
+    """
+    Count games and wins per card and archetype in one grouped pass.
+
+    Works like compute_card_win_counts, but the won vector is replaced by a one-hot matrix of
+    each game's archetype and splash flag (and its won-weighted copy), so a single pair of matrix
+    products per block yields the counts for all 32 archetypes, with and without a splash, at once.
+
+    :returns: DataFrame indexed by (name, archetype, splash) with every archetype and splash present
+              for every card, with one int64 column per WIN_COUNT_COLUMNS entry.
+    """
+    if card_names is None:
+        card_names = get_card_names_from_game_columns(game_df.columns)
+    card_names = list(dict.fromkeys(card_names))
+    card_count = len(card_names)
+    block_columns = ["drawn_" + card for card in card_names] + ["opening_hand_" + card for card in card_names]
+    group_count = ARCHETYPE_COUNT * len(SPLASHES)
+    counts = np.zeros((card_count, group_count, len(WIN_COUNT_COLUMNS)), dtype=np.int64)
+    group_codes = get_archetype_codes(game_df) * len(SPLASHES) + get_splash_flags(game_df)
+
+    for start in range(0, game_df.shape[0], WIN_COUNT_BLOCK_ROWS):
+        rows = game_df.iloc[start:start + WIN_COUNT_BLOCK_ROWS]
+        block = rows[block_columns].to_numpy(dtype=np.float32)
+        won = rows['won'].to_numpy(dtype=np.float32)
+        archetypes = np.zeros((rows.shape[0], group_count), dtype=np.float32)
+        archetypes[np.arange(rows.shape[0]), group_codes[start:start + WIN_COUNT_BLOCK_ROWS]] = 1
+        won_archetypes = archetypes * won[:, np.newaxis]
+        hits = (block == 1).astype(np.float32)
+        gih_hits = np.maximum(hits[:, :card_count], hits[:, card_count:])
+
+        totals = block.T @ archetypes
+        won_totals = hits.T @ won_archetypes
+        counts[:, :, 0] += totals[:card_count].astype(np.int64)
+        counts[:, :, 1] += won_totals[:card_count].astype(np.int64)
+        counts[:, :, 2] += totals[card_count:].astype(np.int64)
+        counts[:, :, 3] += won_totals[card_count:].astype(np.int64)
+        counts[:, :, 4] += (gih_hits.T @ archetypes).astype(np.int64)
+        counts[:, :, 5] += (gih_hits.T @ won_archetypes).astype(np.int64)
+
+    index = pd.MultiIndex.from_product([card_names, ARCHETYPES, SPLASHES], names=['name', 'archetype', 'splash'])
+    return pd.DataFrame(counts.reshape(-1, len(WIN_COUNT_COLUMNS)), index=index, columns=WIN_COUNT_COLUMNS)
+
+def get_overall_win_counts(archetype_counts_df):
+    return archetype_counts_df.groupby(level='name', sort=False).sum()
+
+def get_archetype_win_counts(archetype_counts_df, colors, splash=None):
+    """
+    Win counts per card for the games of one archetype, e.g. colors='UB' or 'WUBRG'.
+
+    :param splash: True or False for only the games with or without a splash, None for both.
+    """
+    counts_df = archetype_counts_df.xs(get_archetype(colors), level='archetype')
+    if splash is None:
+        return counts_df.groupby(level='name', sort=False).sum()
+    return counts_df.xs(splash, level='splash')
+
+def get_card_archetype_cube(archetype_counts_df):
+    """
+    Reshape archetype counts into a dense card x archetype x splash x counter array.
+
+    :returns: (card_names, cube) where
+              cube[i, ARCHETYPES.index(archetype), SPLASHES.index(splash), WIN_COUNT_COLUMNS.index(counter)]
+              is the count for card_names[i].
+    """
+    card_names = archetype_counts_df.index.get_level_values('name').unique()
+    full_index = pd.MultiIndex.from_product([card_names, ARCHETYPES, SPLASHES], names=['name', 'archetype', 'splash'])
+    counts = archetype_counts_df.reindex(full_index, fill_value=0).to_numpy(dtype=np.int64)
+    return list(card_names), counts.reshape(len(card_names), ARCHETYPE_COUNT, len(SPLASHES), len(WIN_COUNT_COLUMNS))
+
+def win_rates_from_counts(counts_df):
+    """Turn the output of compute_card_win_counts into GDWR/OHWR/GIHWR (NaN when a card has no games)."""
+    def rate(won_column, count_column):
+        count = counts_df[count_column].to_numpy(dtype=np.float64)
+        won = counts_df[won_column].to_numpy(dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(count > 0, won / count, np.nan)
+
+    return pd.DataFrame({
+        'GDWR': rate('drawn_won', 'drawn_count'),
+        'OHWR': rate('opening_hand_won', 'opening_hand_count'),
+        'GIHWR': rate('GIH_won', 'GIH_count'),
+    }, index=counts_df.index)
+
+def merge_card_win_counts(counts_df, other_counts_df):
+    """Add two sets of win counts together; cards missing from either side count as zero."""
+    if counts_df is None:
+        return other_counts_df
+    if other_counts_df is None:
+        return counts_df
+    return counts_df.add(other_counts_df, fill_value=0).astype(np.int64)
+
+WATERMARK_COLUMNS = ['game_time', 'draft_time']
+
+def accumulate_new_card_win_counts(game_df_chunks, watermark=None):
+    """
+    Count wins for only the rows newer than a watermark.
+
+    :param game_df_chunks: Iterable of game_data DataFrames.
+    :param watermark:      {'column': ..., 'value': ...} from a previous call, or None to count every row.
+
+    :returns: (counts_df, watermark) where counts_df holds the per archetype counts of the new rows only
+              (None if there were none) and watermark is the latest game_time/draft_time seen so far.
+    """
+    counts_df = None
+    for game_df in game_df_chunks:
+        if watermark is None:
+            column = next((column for column in WATERMARK_COLUMNS if column in game_df.columns), None)
+            if column is not None:
+                watermark = {'column': column, 'value': ''}
+        if watermark is not None:
+            times = game_df[watermark['column']].fillna('').astype(str)
+            if watermark['value']:
+                game_df = game_df[times > watermark['value']]
+                if game_df.shape[0] == 0:
+                    continue
+            watermark = {'column': watermark['column'], 'value': max(watermark['value'], times.max())}
+        counts_df = merge_card_win_counts(counts_df, compute_card_archetype_counts(game_df))
+    return counts_df, watermark
+
+def add_win_rates_to_cards(cards_in_set_df, counts_df):
+    rates_df = win_rates_from_counts(counts_df)
+    for column in WIN_RATE_COLUMNS:
+        cards_in_set_df[column] = cards_in_set_df['name'].map(rates_df[column]).astype(np.float64)
+    return cards_in_set_df
+
 def filter_game_data_to_set(setsymbol, game_df, cards_df):
     cards_in_set_df = cards_df[cards_df['expansion'] == setsymbol].copy()  # Use copy() to avoid modifying the original DataFrame
-    # Initialize columns
-    cards_in_set_df['GDWR'] = None
-    cards_in_set_df['OHWR'] = None
-    cards_in_set_df['GIHWR'] = None
-    for card in cards_in_set_df['name']:
-        drawn_col_name = "drawn_" + card
-        opening_hand_col_name = "opening_hand_" + card
-        # Check if the columns exist
-        if drawn_col_name in game_df.columns and opening_hand_col_name in game_df.columns:
-            # GDWR: Calculate directly
-            drawn_count = game_df[drawn_col_name].sum()  # Number of times card was drawn
-            drawn_game_won_count = game_df[(game_df[drawn_col_name] == 1) & (game_df['won'] == True)].shape[0]
-            GDWR = drawn_game_won_count / drawn_count if drawn_count > 0 else None
-            # OHWR: Calculate directly
-            opening_hand_count = game_df[opening_hand_col_name].sum()  # Number of times card was in opening hand
-            opening_hand_game_won_count = game_df[(game_df[opening_hand_col_name] == 1) & (game_df['won'] == True)].shape[0]
-            OHWR = opening_hand_game_won_count / opening_hand_count if opening_hand_count > 0 else None
-            # GIHWR: Calculate directly
-            GIH_count = ((game_df[drawn_col_name] == 1) | (game_df[opening_hand_col_name] == 1)).sum()
-            GIH_game_won_count = game_df[((game_df[drawn_col_name] == 1) | (game_df[opening_hand_col_name] == 1)) & (game_df['won'] == True)].shape[0]
-            GIHWR = GIH_game_won_count / GIH_count if GIH_count > 0 else None
-            # Assign the calculated values using .loc with the card's index
-            cards_in_set_df.loc[cards_in_set_df['name'] == card, 'GDWR'] = GDWR
-            cards_in_set_df.loc[cards_in_set_df['name'] == card, 'OHWR'] = OHWR
-            cards_in_set_df.loc[cards_in_set_df['name'] == card, 'GIHWR'] = GIHWR   
-    return cards_in_set_df
+    set_card_names = set(cards_in_set_df['name'])
+    card_names = [card for card in get_card_names_from_game_columns(game_df.columns) if card in set_card_names]
+    counts_df = compute_card_win_counts(game_df, card_names)
+    return add_win_rates_to_cards(cards_in_set_df, counts_df)
+
+def filter_card_win_counts_to_set(setsymbol, counts_df, cards_df):
+    cards_in_set_df = cards_df[cards_df['expansion'] == setsymbol].copy()
+    return add_win_rates_to_cards(cards_in_set_df, counts_df)
 
 
-def redownload_card_data_for_set(setsymbol, file_name):
-    cards_df = get_card_data()
-    game_df = get_game_data(setsymbol)
-    if game_df is None:
+def _timed_load(source, function, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        print(f"Loaded {source} in {time.perf_counter() - start:.2f}s")
+
+def redownload_card_data_for_set(setsymbol, cache_path, response=None):
+    # cards.csv and the game data dump are independent, so download and parse them side by side
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        cards_future = executor.submit(_timed_load, "cards.csv", get_card_data, setsymbol)
+        archetype_counts_df = _timed_load("game data for "+setsymbol, update_game_win_counts, setsymbol, response=response)
+        cards_df = cards_future.result()
+    if archetype_counts_df is None or cards_df is None:
         return None
-    cards_in_set_df = filter_game_data_to_set(setsymbol, game_df, cards_df)
+    cards_in_set_df = filter_card_win_counts_to_set(setsymbol, get_overall_win_counts(archetype_counts_df), cards_df)
     if cards_in_set_df.shape[0] > 0:
         #redownload_card_data() no idea why i left this here
-        cards_in_set_df.to_csv(file_name, index=False)
+        save_columnar_cache(cards_in_set_df, cache_path)
     else:
         return None
     return cards_in_set_df    
 
 def get_card_data_for_set(setsymbol):
-    file_name = setsymbol+".csv"
-    if os.path.exists(file_name):
-        modification_time = os.path.getmtime(file_name)
-        modification_datetime = datetime.datetime.fromtimestamp(modification_time)
-        today = datetime.date.today()
-        if modification_datetime.date() < today:
-            print("Card data for "+setsymbol+" is older than today, redownloading")
-            return redownload_card_data_for_set(setsymbol, file_name)
-        else:
-            print("Card data for "+setsymbol+" is fresh, reusing saved data")
-            card_data = pd.read_csv(file_name)
-            return card_data
-    else:
-        return redownload_card_data_for_set(setsymbol, file_name)
+    cache_path = get_cache_path(setsymbol)
+    card_data = load_columnar_cache(cache_path)
+    url = get_game_data_url(setsymbol)
+    try:
+        response = open_url_if_modified(url, use_validators=card_data is not None)
+    except Exception as e:
+        print(f"Could not check game data for {setsymbol}: {e}")
+        return card_data
+
+    if response is None:
+        print("Card data for "+setsymbol+" is unchanged upstream, reusing saved data")
+        return card_data
+
+    with response:
+        if card_data is not None:
+            print("Game data for "+setsymbol+" changed upstream, redownloading")
+        cards_in_set_df = redownload_card_data_for_set(setsymbol, cache_path, response)
+    if cards_in_set_df is None:
+        # Keep the validators as they were so the next check tries again, and fall back to the saved data
+        if card_data is not None:
+            print("Could not rebuild card data for "+setsymbol+", reusing saved data")
+        return card_data
+    record_download_validators(url, response)
+    return cards_in_set_df
+
+def load_set_data(setsymbol):
+    """
+    Load the MTGJSON card list and the 17lands card stats for a set concurrently.
+
+    :returns: (mtgjson_df, cards_in_set_df), where cards_in_set_df is None if no stats are available.
+    """
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        mtgjson_future = executor.submit(_timed_load, "MTGJSON data for "+setsymbol, GetDataForSetFromMTGJson, setsymbol)
+        cards_in_set_future = executor.submit(_timed_load, "card data for "+setsymbol, get_card_data_for_set, setsymbol)
+        mtgjson_df = mtgjson_future.result()
+        cards_in_set_df = cards_in_set_future.result()
+    print(f"Loaded all data for {setsymbol} in {time.perf_counter() - start:.2f}s")
+    return mtgjson_df, cards_in_set_df
 
 
 if __name__ == '__main__':
@@ -0,0 +1,125 @@
+"""
+Stages for processing a log on separate threads, connected by bounded queues.
+
+Each stage has its own thread and consumes its queue in order. A full queue blocks whoever is
+putting into it, so a slow stage holds back the stages before it instead of piling up memory.
+"""
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class PipelineStage:
+    """A thread that handles the items put into its bounded queue one at a time, in order."""
+
+    def __init__(self, name, handle, capacity, on_error=None):
+        """
+        :param handle:   Called with each item on the stage's thread. Puts its output into the next stage.
+        :param capacity: Maximum number of queued items before put() blocks.
+        :param on_error: Called with (item, exception) if handle raises.
+        """
+        self.name = name
+        self.handle = handle
+        self.on_error = on_error
+        self.queue = queue.Queue(maxsize=capacity)
+        self.thread = None
+        self.processed = 0
+        self.max_depth = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def put(self, item):
+        self.queue.put(item)
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def offer(self, item):
+        """Put item unless the queue is full. :returns: Whether it was put."""
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            return False
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name=f'pipeline-{self.name}', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is _STOP:
+                    return
+                start = time.perf_counter()
+                try:
+                    self.handle(item)
+                except Exception as e:
+                    if self.on_error is not None:
+                        self.on_error(item, e)
+                self.busy_seconds += time.perf_counter() - start
+                self.processed += 1
+            finally:
+                self.queue.task_done()
+
+    def drain(self):
+        """Wait until everything put so far has been handled."""
+        if self.running:
+            self.queue.join()
+
+    def stop(self):
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+
+    def get_metrics(self):
+        return {
+            'depth': self.queue.qsize(),
+            'max_depth': self.max_depth,
+            'capacity': self.queue.maxsize,
+            'processed': self.processed,
+            'busy_seconds': round(self.busy_seconds, 3),
+        }
+
+
+class Pipeline:
+    """Stages in the order items flow through them."""
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def drain(self):
+        # Upstream stages hand their output on before finishing an item, so draining in order
+        # leaves every stage empty.
+        for stage in self.stages:
+            stage.drain()
+
+    def close(self):
+        self.drain()
+        for stage in self.stages:
+            stage.stop()
+
+    def get_metrics(self):
+        return {stage.name: stage.get_metrics() for stage in self.stages}
+
+    def format_metrics(self):
+        return '; '.join(
+            f"{name}: depth {metrics['depth']}/{metrics['capacity']} (max {metrics['max_depth']}), "
+            f"{metrics['processed']} handled in {metrics['busy_seconds']}s"
+            for name, metrics in self.get_metrics().items()
+        )
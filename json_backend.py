@@ -0,0 +1,58 @@
+"""
+Decoding JSON from the log with the fastest available library.
+
+orjson and ujson are optional; the standard library decoder is always available as a fallback.
+"""
+import importlib
+import json
+
+JSON_BACKENDS = ('orjson', 'ujson', 'json')
+AUTO_BACKEND = 'auto'
+
+
+class JsonDecoder:
+    """
+    A drop-in for json.JSONDecoder.raw_decode backed by a faster library's loads.
+
+    The fast path only applies when the JSON runs to the end of the string (trailing whitespace is
+    fine). Anything it rejects, such as trailing text after the JSON or integers too large for the
+    library, is decoded again by the standard library so results and errors match json.JSONDecoder.
+    """
+
+    def __init__(self, name, loads):
+        self.name = name
+        self._loads = loads
+        self._fallback = json.JSONDecoder()
+
+    def raw_decode(self, s, idx=0):
+        try:
+            return self._loads(s[idx:] if idx else s), len(s)
+        except (ValueError, TypeError, OverflowError):
+            return self._fallback.raw_decode(s, idx)
+
+
+def _import_backend(name):
+    module = importlib.import_module(name)
+    return JsonDecoder(name, module.loads)
+
+
+def get_json_decoder(backend=AUTO_BACKEND):
+    """
+    :param backend: One of JSON_BACKENDS, or 'auto' for the first one that is installed.
+
+    :returns: A JsonDecoder. For 'json' this is a plain json.JSONDecoder.
+    """
+    if backend == 'json':
+        return json.JSONDecoder()
+    if backend != AUTO_BACKEND:
+        return _import_backend(backend)
+
+    for name in JSON_BACKENDS:
+        try:
+            return get_json_decoder(name)
+        except ImportError:
+            pass
+
+
+def get_json_decoder_name(decoder):
+    return getattr(decoder, 'name', 'json')
@@ -0,0 +1,233 @@
+"""
+Reading and following a Magic Arena log: block reads, waiting for changes, and byte offset
+checkpoints for resuming across restarts.
+"""
+import hashlib
+import json
+import os
+import select
+import sys
+import time
+
+FINGERPRINT_BYTES = 4096
+
+
+def get_file_identity(filename):
+    """
+    Identify a log file independently of its name, so a replaced or rotated log is not mistaken for the old one.
+
+    :returns: Dict of device, inode and a hash of the first FINGERPRINT_BYTES bytes of the file.
+    """
+    stat = os.stat(filename)
+    with open(filename, 'rb') as f:
+        head = f.read(FINGERPRINT_BYTES)
+    return {
+        'device': stat.st_dev,
+        'inode': stat.st_ino,
+        'fingerprint': hashlib.sha1(head).hexdigest(),
+        'fingerprint_size': len(head),
+    }
+
+
+def _identity_matches(filename, identity):
+    stat = os.stat(filename)
+    if (stat.st_dev, stat.st_ino) != (identity['device'], identity['inode']):
+        return False
+    with open(filename, 'rb') as f:
+        head = f.read(identity['fingerprint_size'])
+    return hashlib.sha1(head).hexdigest() == identity['fingerprint']
+
+
+class LogCheckpoint:
+    """
+    Persists, per log file, the byte offset of the last entry boundary that was fully processed
+    along with a small amount of follower state, in a JSON file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _load_all(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def load(self, filename):
+        """
+        Find where to resume reading filename.
+
+        :returns: (offset, state), or (0, None) if there is no usable checkpoint because the file
+                  was replaced, truncated below the checkpoint, or never seen.
+        """
+        checkpoint = self._load_all().get(os.path.abspath(filename))
+        if checkpoint is None:
+            return 0, None
+        try:
+            if not _identity_matches(filename, checkpoint['identity']):
+                return 0, None
+            if os.path.getsize(filename) < checkpoint['offset']:
+                return 0, None
+        except (OSError, KeyError):
+            return 0, None
+        return checkpoint['offset'], checkpoint.get('state')
+
+    def save(self, filename, offset, state):
+        checkpoints = self._load_all()
+        checkpoints[os.path.abspath(filename)] = {
+            'identity': get_file_identity(filename),
+            'offset': offset,
+            'state': state,
+        }
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(checkpoints, f)
+        os.replace(temp_path, self.path)
+
+
+READ_BLOCK_SIZE = 1 << 20
+
+
+class LogReader:
+    """Reads a log in large blocks and splits it into lines in memory, keeping track of byte offsets."""
+
+    def __init__(self, f, offset):
+        self.f = f
+        self.offset = offset
+        self.pending = b''
+
+    def read_lines(self):
+        """
+        Read the next block from the file.
+
+        :returns: List of (offset, line) for the complete lines in the block (possibly empty if the
+                  block ended mid-line), or None if there was nothing new to read.
+        """
+        block = self.f.read(READ_BLOCK_SIZE)
+        if not block:
+            return None
+
+        lines = (self.pending + block).split(b'\n')
+        self.pending = lines.pop()
+        result = []
+        offset = self.offset
+        for line in lines:
+            result.append((offset, line + b'\n'))
+            offset += len(line) + 1
+        self.offset = offset
+        return result
+
+    def flush_pending(self):
+        """Return the trailing partial line (if any) as a final (offset, line), e.g. when the file is not being followed."""
+        if not self.pending:
+            return None
+        line = (self.offset, self.pending)
+        self.offset += len(self.pending)
+        self.pending = b''
+        return line
+
+
+POLL_INTERVAL_SECONDS = 0.05
+
+# From <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVE_SELF = 0x00000800
+_IN_DELETE_SELF = 0x00000400
+
+
+class _InotifyWaiter:
+    """Blocks until the kernel reports a change to the file (Linux only)."""
+
+    def __init__(self, filename):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        mask = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVE_SELF | _IN_DELETE_SELF
+        if libc.inotify_add_watch(self.fd, os.fsencode(filename), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f'inotify_add_watch failed for {filename}')
+
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollingWaiter:
+    """Polls the file's size and modification time at a short interval."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.last_stat = self._stat()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.filename)
+            return stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            current_stat = self._stat()
+            if current_stat != self.last_stat:
+                self.last_stat = current_stat
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(POLL_INTERVAL_SECONDS, remaining))
+
+    def close(self):
+        pass
+
+
+class FileChangeWaiter:
+    """
+    Waits for a file to change, returning as soon as it does or after a timeout.
+
+    Uses inotify on Linux and falls back to polling elsewhere or if inotify is unavailable.
+    """
+
+    def __init__(self, filename):
+        self._waiter = None
+        if sys.platform.startswith('linux'):
+            try:
+                self._waiter = _InotifyWaiter(filename)
+            except (OSError, AttributeError):
+                self._waiter = None
+        if self._waiter is None:
+            self._waiter = _PollingWaiter(filename)
+
+    def wait(self, timeout):
+        """:returns: Whether a change was seen before the timeout."""
+        return self._waiter.wait(timeout)
+
+    def close(self):
+        self._waiter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -15,15 +15,16 @@ import argparse
 import copy
 import json
 import getpass
+import hashlib
 import itertools
 import os
 import os.path
-import pathlib
 import re
 import subprocess
 import sys
 import time
 import datetime
+import functools
 import traceback
 import uuid
 import threading
@@ -38,10 +39,16 @@ from card_positions import *
 
 from collections import defaultdict
 from collections import Counter
+from collections import deque
+from collections import namedtuple
 
 
 import threading
 from overlay import *
+from log_tailer import FileChangeWaiter, LogCheckpoint, LogReader
+from json_backend import AUTO_BACKEND, JSON_BACKENDS, get_json_decoder, get_json_decoder_name
+from follower_pipeline import Pipeline, PipelineStage
+from submission_sinks import SqliteSink
 
 import dateutil.parser
 
@@ -135,6 +142,13 @@ POSSIBLE_CURRENT_FILEPATHS = list(map(lambda root_and_path: os.path.join(*root_a
 POSSIBLE_PREVIOUS_FILEPATHS = list(map(lambda root_and_path: os.path.join(*root_and_path), itertools.product(POSSIBLE_ROOTS, (PREVIOUS_LOG_PATH, ))))
 
 CONFIG_FILE = os.path.join(os.path.expanduser('~'), '.mtga_follower.ini')
+CHECKPOINT_FILE = os.path.join(os.path.expanduser('~'), '.mtga_follower_checkpoint.json')
+OUTBOX_FILE = os.path.join(os.path.expanduser('~'), '.mtga_follower_outbox.sqlite3')
+LOCAL_SINK_FILE = os.path.join(os.path.expanduser('~'), '.mtga_follower_submissions.sqlite3')
+SINKS = ('http', 'sqlite')
+CHECKPOINT_INTERVAL_SECONDS = 5
+ENTRY_QUEUE_SIZE = 64
+PIPELINE_METRICS_INTERVAL_SECONDS = 60
 
 LOG_START_REGEX_TIMED = re.compile(r'^\[(UnityCrossThreadLogger|Client GRE)\](\d[\d:/ .-]+(AM|PM)?)')
 LOG_START_REGEX_UNTIMED = re.compile(r'^\[(UnityCrossThreadLogger|Client GRE)\]')
@@ -144,6 +158,21 @@ JSON_START_REGEX = re.compile(r'[\[\{]')
 ACCOUNT_INFO_REGEX = re.compile(r'.*Updated account\. DisplayName:(.*), AccountID:(.*), Token:.*')
 MATCH_ACCOUNT_INFO_REGEX = re.compile(r'.*: ((\w+) to Match|Match to (\w+)):')
 SLEEP_TIME = 0.5
+# First timestamp value in the raw text of a message, including in nested, re-serialized payloads.
+RAW_TIMESTAMP_REGEX = re.compile(r'"timestamp\\*"\s*:\s*\\*"?([^"\\,}\s]+)')
+MAX_LOG_ENTRY_AGE_SECONDS = 10
+
+LOG_START_PREFIXES = ('[UnityCrossThreadLogger]', '[Client GRE]')
+DETAILED_LOGS_PREFIX = 'DETAILED LOGS: '
+# Lines of a multi-line JSON message start with indentation or JSON punctuation.
+CONTINUATION_FIRST_CHARS = frozenset(' \t\r\n{}]",')
+TIMESTAMP_FIRST_CHARS = frozenset('0123456789/.-')
+
+LINE_CONTINUATION = 'continuation'
+LINE_LOG_START = 'log_start'
+LINE_TIMESTAMP = 'timestamp'
+LINE_DETAILED_LOGS = 'detailed_logs'
+LINE_OTHER = 'other'
 
 TIME_FORMATS = (
     '%Y-%m-%d %I:%M:%S %p',
@@ -162,6 +191,7 @@ OUTPUT_TIME_FORMAT = '%Y%m%d%H%M%S'
 MAX_MILLISECONDS_SINCE_EPOCH = int(1000 * datetime.datetime(3000, 1, 1).timestamp())
 
 _ERROR_LINES_RECENCY = 10
+RECENT_BLOB_DIGEST_COUNT = 32
 
 def list_difference(list1, list2):
     count1 = Counter(list1)
@@ -188,81 +218,156 @@ def is_point_inside_polygon(x, y, polygon):
     return inside
 
 
-def get_card_packdebug_info(card_id, cards_in_set_df):
-    try:
-        # Lookup card in cards_in_set_df by card_id
-        card_row = cards_in_set_df[cards_in_set_df['id'] == card_id]
-        
-        if card_row.empty:
-            return json.dumps({"error": f"Card ID {card_id} not found"})
-        
-        # Extract the card information
-        name = card_row['name'].values[0]
-        rarity = card_row['rarity'].values[0] if 'rarity' in card_row.columns else None
-        number = card_row['number'].values[0] if 'number' in card_row.columns else None
-        boosterTypes = card_row['boosterTypes'].values[0] if 'boosterTypes' in card_row.columns else None
-        
-        # Create a dictionary with the card information
-        card_info = {
+def format_card_overlay_text(card_name, GDWR, OHWR, GIHWR):
+    info_parts = []
+    info_parts.append(f"GDWR: {GDWR:.2f}" if isinstance(GDWR, float) else f"GDWR: {GDWR}")
+    info_parts.append(f"OHWR: {OHWR:.2f}" if isinstance(OHWR, float) else f"OHWR: {OHWR}")
+    info_parts.append(f"GIHWR: {GIHWR:.2f}" if isinstance(GIHWR, float) else f"GIHWR: {GIHWR}")
+    info_string = ", ".join(info_parts)
+    return f"{card_name} ({info_string})" if info_parts else card_name
+
+def build_card_index(cards_df):
+    """
+    Build an arena id keyed dict of everything the draft overlay needs about each card in a set.
+
+    This is done once when set data loads so that preparing a pack is a dict lookup per card.
+    Cards without win rate columns (e.g. MTGJSON data) get 'N/A' for GDWR/OHWR/GIHWR.
+    """
+    card_index = {}
+    for card in cards_df.to_dict('records'):
+        card_id = card.get('id')
+        if card_id is None or card_id != card_id:
+            continue
+        card_id = int(card_id)
+        if card_id in card_index:
+            continue
+
+        GDWR = card.get('GDWR', 'N/A')
+        OHWR = card.get('OHWR', 'N/A')
+        GIHWR = card.get('GIHWR', 'N/A')
+        card_index[card_id] = {
             'id': card_id,
-            'name': name,
-            'rarity': rarity,
-            'number': number,
-            'boosterTypes': boosterTypes
+            'name': card['name'],
+            'rarity': card.get('rarity'),
+            'number': card.get('number'),
+            'boosterTypes': card.get('boosterTypes'),
+            'GDWR': GDWR,
+            'OHWR': OHWR,
+            'GIHWR': GIHWR,
+            'overlay_text': format_card_overlay_text(card['name'], GDWR, OHWR, GIHWR),
+            # Use GIHWR for sorting if it exists and is a number, otherwise use 0
+            'sort_value': float(GIHWR) if isinstance(GIHWR, (int, float)) else 0,
         }
-        
-        # Remove any None values to keep the JSON clean
-        card_info = {k: v for k, v in card_info.items() if v is not None}
+    return card_index
+
+def get_card_packdebug_info(card_id, card_index):
+    card = card_index.get(card_id)
+    if card is None:
+        return json.dumps({"error": f"Card ID {card_id} not found"})
+
+    card_info = {
+        'id': card_id,
+        'name': card['name'],
+        'rarity': card['rarity'],
+        'number': card['number'],
+        'boosterTypes': card['boosterTypes'],
+    }
+
+    # Remove any None values to keep the JSON clean
+    return {k: v for k, v in card_info.items() if v is not None}
+
+def get_card_info(card_id, card_index):
+    card = card_index.get(card_id)
+    if card is None:
+        return (f"Card ID {card_id} not found", float('-inf'))  # Assign -inf for cards not found
+    return (card['overlay_text'], card['sort_value'])
+
+def classify_log_line(line):
+    """
+    Decide which parse a log line needs by looking at its first characters.
+
+    :returns: One of the LINE_* kinds.
+    """
+    first_char = line[:1]
+    if first_char in CONTINUATION_FIRST_CHARS:
+        return LINE_CONTINUATION
+    if first_char == '[':
+        return LINE_LOG_START if line.startswith(LOG_START_PREFIXES) else LINE_OTHER
+    if first_char in TIMESTAMP_FIRST_CHARS:
+        return LINE_TIMESTAMP
+    if first_char == 'D' and line.startswith(DETAILED_LOGS_PREFIX):
+        return LINE_DETAILED_LOGS
+    return LINE_OTHER
+
+
+def _strip_time_string(time_str):
+    time_str = STRIPPED_TIMESTAMP_REGEX.match(time_str).group(1)
+    if ': ' in time_str:
+        time_str = time_str.split(': ')[0]
+    return time_str
+
+
+TIME_FORMAT_DIRECTIVES = {
+    '%Y': r'(?P<year>\d{4})',
+    '%m': r'(?P<month>\d{1,2})',
+    '%d': r'(?P<day>\d{1,2})',
+    '%H': r'(?P<hour>\d{1,2})',
+    '%I': r'(?P<hour>\d{1,2})',
+    '%M': r'(?P<minute>\d{1,2})',
+    '%S': r'(?P<second>\d{1,2})',
+    '%p': r'(?P<meridiem>[AP]M)',
+}
+
+
+def _compile_time_format(time_format):
+    """Translate a TIME_FORMATS entry into an equivalent regex, which is much cheaper than a failing strptime."""
+    pattern = re.escape(time_format).replace('\\ ', r'\s+')
+    for directive, group in TIME_FORMAT_DIRECTIVES.items():
+        pattern = pattern.replace(re.escape(directive), group)
+    return re.compile(pattern + '$', re.IGNORECASE)
+
+
+TIME_FORMAT_REGEXES = {time_format: _compile_time_format(time_format) for time_format in TIME_FORMATS}
+TIME_CACHE_SIZE = 256
 
-        return card_info
-    
-    except Exception as e:
-        logger.error(f'Error processing get_card_packdebug_info: {e}')
-        return json.dumps({"error": f"Error processing card ID {card_id}: {str(e)}"})
 
-def get_card_info(card_id, cards_in_set_df):
+def _parse_time_fast(time_str, time_format):
+    match = TIME_FORMAT_REGEXES[time_format].match(time_str)
+    if match is None:
+        return None
+    hour = int(match.group('hour'))
+    meridiem = match.groupdict().get('meridiem')
+    if meridiem is not None:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem.upper() == 'PM' else 0)
     try:
-        # Lookup card in cards_in_set_df by card_id
-        card_row = cards_in_set_df[cards_in_set_df['id'] == card_id]
-        # If card exists, extract the details
-        if not card_row.empty:
-            card_name = card_row['name'].values[0]
-            
-            # Check if each column exists and get its value, or use 'N/A' if it doesn't exist
-            GDWR = card_row['GDWR'].values[0] if 'GDWR' in card_row.columns else 'N/A'
-            OHWR = card_row['OHWR'].values[0] if 'OHWR' in card_row.columns else 'N/A'
-            GIHWR = card_row['GIHWR'].values[0] if 'GIHWR' in card_row.columns else 'N/A'
-            
-            # Format the string based on which values are available
-            info_parts = []
-            info_parts.append(f"GDWR: {GDWR:.2f}" if isinstance(GDWR, float) else f"GDWR: {GDWR}")
-            info_parts.append(f"OHWR: {OHWR:.2f}" if isinstance(OHWR, float) else f"OHWR: {OHWR}")
-            info_parts.append(f"GIHWR: {GIHWR:.2f}" if isinstance(GIHWR, float) else f"GIHWR: {GIHWR}")            
-            # if GDWR != 'N/A':
-            #     info_parts.append(f"GDWR: {GDWR:.2f}" if isinstance(GDWR, float) else f"GDWR: {GDWR}")
-            # if OHWR != 'N/A':
-            #     info_parts.append(f"OHWR: {OHWR:.2f}" if isinstance(OHWR, float) else f"OHWR: {OHWR}")
-            # if GIHWR != 'N/A':
-            #     info_parts.append(f"GIHWR: {GIHWR:.2f}" if isinstance(GIHWR, float) else f"GIHWR: {GIHWR}")
-            
-            info_string = ", ".join(info_parts)
-            formatted_string = f"{card_name} ({info_string})" if info_parts else card_name
-
-            # info_string = ""
-            # for part in info_parts:
-            #     info_string += part
-            #     info_string += "\n"
-            #formatted_string = f"{info_string}" if info_parts else card_name
-            
-            # Use GIHWR for sorting if it exists and is a number, otherwise use 0
-            sort_value = float(GIHWR) if isinstance(GIHWR, (int, float)) else 0
-            
-            return (formatted_string, sort_value)
-        else:
-            return (f"Card ID {card_id} not found", float('-inf'))  # Assign -inf for cards not found
-    except Exception as e:
-        logger.error(f'Error processing get_card_info: {e}')
-        return (f"Error processing card ID {card_id}", float('-inf'))
+        return datetime.datetime(
+            int(match.group('year')), int(match.group('month')), int(match.group('day')),
+            hour, int(match.group('minute')), int(match.group('second')),
+        )
+    except ValueError:
+        return None
+
+
+def _parse_time(time_str, formats):
+    """
+    :returns: (datetime, format) for the first of formats that time_str matches.
+    :raises ValueError: If it matches none of them.
+    """
+    for possible_format in formats:
+        result = _parse_time_fast(time_str, possible_format)
+        if result is not None:
+            return result, possible_format
+
+    # strptime is a little more lenient than the regexes (e.g. about padding), so give it the last word
+    for possible_format in formats:
+        try:
+            return datetime.datetime.strptime(time_str, possible_format), possible_format
+        except ValueError:
+            pass
+    raise ValueError(f'Unsupported time format: "{time_str}"')
+
 
 def extract_time(time_str):
     """
@@ -273,16 +378,63 @@ def extract_time(time_str):
     :returns: The resulting datetime object.
     :raises ValueError: Raises an exception if it cannot interpret the string.
     """
-    time_str = STRIPPED_TIMESTAMP_REGEX.match(time_str).group(1)
-    if ': ' in time_str:
-        time_str = time_str.split(': ')[0]
+    return _parse_time(_strip_time_string(time_str), TIME_FORMATS)[0]
 
-    for possible_format in TIME_FORMATS:
-        try:
-            return datetime.datetime.strptime(time_str, possible_format)
-        except ValueError:
-            pass
-    raise ValueError(f'Unsupported time format: "{time_str}"')
+
+class TimestampParser:
+    """
+    Converts the time strings of a single log to datetimes, like extract_time.
+
+    A log uses one format throughout, so the first format that works is tried first from then on.
+    This also settles day/month ambiguity for the whole log instead of per line. Lines within the
+    same second share a time string, so recent results are cached.
+    """
+
+    def __init__(self):
+        self.time_format = None
+        self._cache = {}
+
+    def parse(self, time_str):
+        result = self._cache.get(time_str)
+        if result is not None:
+            return result
+
+        stripped_time_str = _strip_time_string(time_str)
+        result = None
+        if self.time_format is not None:
+            result = _parse_time_fast(stripped_time_str, self.time_format)
+        if result is None:
+            result, self.time_format = _parse_time(stripped_time_str, TIME_FORMATS)
+
+        if len(self._cache) >= TIME_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[time_str] = result
+        return result
+
+
+def parse_utc_timestamp(timestamp):
+    """
+    Convert a timestamp from a log message: milliseconds since the epoch, .NET ticks, or ISO 8601.
+    """
+    try:
+        timestamp_value = int(timestamp)
+
+        if timestamp_value < MAX_MILLISECONDS_SINCE_EPOCH:
+            return datetime.datetime.fromtimestamp(timestamp_value * 0.001)
+
+        else:
+            seconds_since_year_1 = timestamp_value / 10000000
+            return datetime.datetime.fromordinal(1) + datetime.timedelta(seconds=seconds_since_year_1)
+
+    except ValueError:
+        return dateutil.parser.isoparse(timestamp)
+
+
+def get_log_entry_age_seconds(log_time):
+    """Seconds between a log message's timestamp (treated as UTC if naive) and now."""
+    if log_time.tzinfo is None:
+        log_time = log_time.replace(tzinfo=datetime.timezone.utc)
+    return (datetime.datetime.now(datetime.timezone.utc) - log_time).total_seconds()
 
 
 def json_value_matches(expectation, path, blob):
@@ -317,6 +469,75 @@ def get_rank_string(rank_class, level, percentile, place, step):
     """
     return '-'.join(str(x) for x in [rank_class, level, percentile, place, step])
 
+BlobHandler = namedtuple('BlobHandler', ['marker', 'key', 'condition', 'handle'])
+BlobHandler.__doc__ = """
+A handler for one kind of complete log message.
+
+:param marker:    Text that must appear before the JSON in the message (e.g. the method name), or None.
+:param key:       Top-level key the decoded JSON must have, or None.
+:param condition: Optional extra check taking (follower, json_obj).
+:param handle:    Called with (follower, json_obj, timestamp) when the message matches.
+"""
+
+
+# A complete log message, with the log time of its lines
+LogEntry = namedtuple('LogEntry', ['full_log', 'log_time', 'raw_time'])
+# A decoded log message ready for its handler; handler is None if only utc_time needs recording
+ParsedEntry = namedtuple('ParsedEntry', ['full_log', 'log_time', 'raw_time', 'utc_time', 'timestamp', 'json_obj', 'handler'])
+
+
+class BlobHandlerRegistry:
+    """
+    Finds the handler for a complete log message from its markers and top-level JSON keys, without
+    scanning the message once per handler. Handlers are tried in the order they are registered.
+    """
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+        self.priorities_by_marker = defaultdict(list)
+        self.priorities_by_key = defaultdict(list)
+        for priority, handler in enumerate(handlers):
+            if handler.marker is not None:
+                self.priorities_by_marker[handler.marker].append(priority)
+            elif handler.key is not None:
+                self.priorities_by_key[handler.key].append(priority)
+            else:
+                raise ValueError(f'Handler {handler} needs a marker or a key')
+        markers = sorted(self.priorities_by_marker, key=len, reverse=True)
+        self.marker_regex = re.compile('|'.join(re.escape(marker) for marker in markers))
+        keys = '|'.join(re.escape(key) for key in self.priorities_by_key)
+        self.relevance_regex = re.compile(self.marker_regex.pattern + f'|(?:{keys})\\\\*"')
+
+    def might_match(self, full_log):
+        """
+        Cheaply check the raw text of a message for any marker or quoted key a handler needs, so
+        messages no handler could match are never decoded.
+        """
+        return self.relevance_regex.search(full_log) is not None
+
+    def find(self, follower, header, json_obj):
+        """
+        :param header:   Text of the message before the JSON.
+        :param json_obj: The decoded JSON of the message.
+
+        :returns: The first matching BlobHandler, or None.
+        """
+        priorities = []
+        for marker in set(self.marker_regex.findall(header)):
+            priorities.extend(self.priorities_by_marker[marker])
+        for key, key_priorities in self.priorities_by_key.items():
+            if key in json_obj:
+                priorities.extend(key_priorities)
+
+        for priority in sorted(priorities):
+            handler = self.handlers[priority]
+            if handler.key is not None and handler.key not in json_obj:
+                continue
+            if handler.condition is None or handler.condition(follower, json_obj):
+                return handler
+        return None
+
+
 class Round:
     def __init__(self):
         self.boosters = []
@@ -333,21 +554,97 @@ class DraftOpens:
 class Follower:
     """Follows along a log, parses the messages, and passes along the parsed data to the API endpoint."""
 
-    def __init__(self, token, follower_thread, host, debug_mode):
+    # Handlers for complete log messages, tried in this order.
+    _BLOB_HANDLERS = BlobHandlerRegistry((
+        BlobHandler(None, 'params', # Doesn't exist any more
+            lambda self, blob: json_value_matches('Client.Connected', ['params', 'messageName'], blob),
+            lambda self, blob, timestamp: self.__handle_login(blob)),
+        BlobHandler('SceneChange', 'fromSceneName', None,
+            lambda self, blob, timestamp: self.__handle_scenechange(blob)),
+        BlobHandler('Event_Join', 'EventName', None,
+            lambda self, blob, timestamp: self.__handle_joined_pod(blob)),
+        BlobHandler(None, 'DraftStatus', None,
+            lambda self, blob, timestamp: self.__handle_bot_draft_pack(blob)),
+        BlobHandler('BotDraft_DraftPick', 'PickInfo', None,
+            lambda self, blob, timestamp: self.__handle_bot_draft_pick(blob['PickInfo'])),
+        BlobHandler('LogBusinessEvents', 'PickGrpId', None,
+            lambda self, blob, timestamp: self.__handle_human_draft_combined(blob)),
+        BlobHandler('LogBusinessEvents', 'WinningType', None,
+            lambda self, blob, timestamp: self.__handle_log_business_game_end(blob)),
+        BlobHandler('Draft.Notify ', None,
+            lambda self, blob: 'method' not in blob,
+            lambda self, blob, timestamp: self.__handle_human_draft_pack(blob)),
+        BlobHandler('Event_SetDeck', 'EventName', None,
+            lambda self, blob, timestamp: self.__handle_deck_submission(blob)),
+        BlobHandler('Event_GetCourses', 'Courses', None,
+            lambda self, blob, timestamp: self.__handle_ongoing_events(blob)),
+        BlobHandler('Event_ClaimPrize', 'EventName', None,
+            lambda self, blob, timestamp: self.__handle_claim_prize(blob)),
+        BlobHandler('Draft_CompleteDraft', 'DraftId', None,
+            lambda self, blob, timestamp: self.__handle_event_course(blob)),
+        BlobHandler(None, 'authenticateResponse', None,
+            lambda self, blob, timestamp: self.__update_screen_name(blob['authenticateResponse']['screenName'])),
+        BlobHandler(None, 'matchGameRoomStateChangedEvent', None,
+            lambda self, blob, timestamp: self.__handle_match_state_changed(blob)),
+        BlobHandler(None, 'greToClientEvent',
+            lambda self, blob: 'greToClientMessages' in blob['greToClientEvent'],
+            lambda self, blob, timestamp: self.__handle_gre_to_client_event(blob, timestamp)),
+        BlobHandler(None, 'clientToMatchServiceMessageType',
+            lambda self, blob: blob['clientToMatchServiceMessageType'] == 'ClientToMatchServiceMessageType_ClientToGREMessage',
+            lambda self, blob, timestamp: self.__handle_client_to_gre_message(blob.get('payload', {}), timestamp)),
+        BlobHandler(None, 'clientToMatchServiceMessageType',
+            lambda self, blob: blob['clientToMatchServiceMessageType'] == 'ClientToMatchServiceMessageType_ClientToGREUIMessage',
+            lambda self, blob, timestamp: self.__handle_client_to_gre_ui_message(blob.get('payload', {}), timestamp)),
+        BlobHandler('Rank_GetCombinedRankInfo', 'limitedSeasonOrdinal', None,
+            lambda self, blob, timestamp: self.__handle_self_rank_info(blob)),
+        BlobHandler(' PlayerInventory.GetPlayerCardsV3 ', None, # Doesn't exist any more
+            lambda self, blob: 'method' not in blob,
+            lambda self, blob, timestamp: self.__handle_collection(blob)),
+        BlobHandler(None, 'DTO_InventoryInfo', None,
+            lambda self, blob, timestamp: self.__handle_inventory(blob['DTO_InventoryInfo'])),
+        BlobHandler(None, 'NodeStates',
+            lambda self, blob: 'RewardTierUpgrade' in blob['NodeStates'],
+            lambda self, blob, timestamp: self.__handle_player_progress(blob)),
+        BlobHandler('FrontDoorConnection.Close ', None, None,
+            lambda self, blob, timestamp: self.__reset_current_user()),
+        BlobHandler('Reconnect result : Connected', None, None,
+            lambda self, blob, timestamp: self.__handle_reconnect_result()),
+    ))
+
+    def __init__(self, token, follower_thread, host, debug_mode, json_backend=AUTO_BACKEND, headless=False, client=None):
+        """
+        :param headless: Skip the overlay and the mouse listener, e.g. for processing archived logs.
+        :param client:   SubmissionSink to submit to, instead of an ApiClient for host.
+        """
         self.debug_mode = debug_mode
+        self.headless = headless
+        # Messages older than this are skipped; None processes everything, e.g. for archived logs
+        self.max_entry_age_seconds = MAX_LOG_ENTRY_AGE_SECONDS
         #self.overlay_active = False
         self.host = host
         self.token = token
-        self.json_decoder = json.JSONDecoder()
+        self.json_decoder = get_json_decoder(json_backend)
+        logger.info(f'Decoding log messages with {get_json_decoder_name(self.json_decoder)}')
+        self.checkpoint = LogCheckpoint(CHECKPOINT_FILE)
+        self.entry_boundary_offset = 0
+        # Reading lines happens on the caller's thread, decoding and handling each get a stage, and the
+        # API client posts submissions from its own workers. Periodic overlay refreshes capture the
+        # screen, so they get a stage of their own off to the side instead of holding up dispatch.
+        self.__parse_stage = PipelineStage('parse', self.__parse_entry, ENTRY_QUEUE_SIZE, self.__on_pipeline_error)
+        self.__dispatch_stage = PipelineStage('dispatch', self.__dispatch, ENTRY_QUEUE_SIZE, self.__on_pipeline_error)
+        self.__overlay_stage = PipelineStage('overlay', self.__run_overlay_update, 1, self.__on_pipeline_error)
+        self.pipeline = Pipeline([self.__parse_stage, self.__dispatch_stage, self.__overlay_stage])
         #self._api_client = seventeenlands.api_client.ApiClient(host=host)
-        self._api_client = api_client.ApiClient(host=host)
+        self._api_client = client if client is not None else api_client.ApiClient(host=host)
         self._reinitialize()
         #self.OVERLAY_UPDATE_INTERVAL = .01
         self.OVERLAY_UPDATE_INTERVAL_MAX_TIME = 5
         self.__DOUBLE_CLICK_DELAY = 1
         self.TIME_TO_WAIT_FOR_MOUSE_BASED_OVERLAY_UPDATE = 0.3
-        self.mouse_listener = mouse.Listener(on_click=self.on_click)
-        self.mouse_listener.start()        
+        self.mouse_listener = None
+        if not headless:
+            self.mouse_listener = mouse.Listener(on_click=self.on_click)
+            self.mouse_listener.start()        
         self.click_area = [(2179, 8), (2179, 88), (2090, 88), (2090, 8)]        
         self.__last_mouse_click_time = 0        
         self.last_overlay_update = 0
@@ -355,7 +652,8 @@ class Follower:
         self.__last_pack = None        
         self.__draft_opens = DraftOpens()        
         self.__time_last_overlaid = None
-        self.__cards_in_set_df = None
+        self.__card_index = None
+        self.__mtgjson_card_index = {}
         self.__set_data_not_available = False        
         self.__currentScene = None
         self.__last_card_details_withstats = []
@@ -366,7 +664,21 @@ class Follower:
 
 
     def _reinitialize(self):
-        self.buffer = []
+        self.__reset_reader()
+        self.__reset_state()
+
+    def __reset_reader(self):
+        """Reset what is tracked while reading lines, which is only touched on the reading thread."""
+        self.__reset_buffer()
+        self.line_log_time = datetime.datetime.fromtimestamp(0)
+        self.line_raw_time = ''
+        self.recent_blob_digests = deque(maxlen=RECENT_BLOB_DIGEST_COUNT)
+        self.recent_blob_digest_set = set()
+        self.recent_lines = deque(maxlen=_ERROR_LINES_RECENCY)
+        self.timestamp_parser = TimestampParser()
+
+    def __reset_state(self):
+        """Reset the user, draft and game state, which is only touched by the dispatch stage."""
         self.cur_log_time = datetime.datetime.fromtimestamp(0)
         self.last_utc_time = datetime.datetime.fromtimestamp(0)
         self.last_raw_time = ''
@@ -400,9 +712,7 @@ class Follower:
         self.pending_game_result = {}
         self.pending_match_result = {}
 
-        self.last_blob = ''
         self.current_debug_blob = ''
-        self.recent_lines = []
 
         self.__last_mouse_click_time = 0        
         self.last_overlay_update = 0
@@ -410,7 +720,7 @@ class Follower:
         self.__last_pack = None        
         self.__draft_opens = DraftOpens()        
         self.__time_last_overlaid = None
-        self.__cards_in_set_df = None
+        self.__card_index = None
         self.__set_data_not_available = False        
         self.__currentScene = None        
         self.__last_card_details_withstats = []
@@ -450,30 +760,114 @@ class Follower:
             **blob,
         }
 
+    def _get_checkpoint_state(self):
+        return {
+            'cur_user': self.cur_user,
+            'user_screen_name': self.user_screen_name,
+            'cur_draft_event': self.cur_draft_event,
+            'cur_rank_data': self.cur_rank_data,
+            'last_raw_time': self.last_raw_time,
+            'cur_log_time': self.cur_log_time.isoformat(),
+            'last_utc_time': self.last_utc_time.isoformat(),
+        }
+
+    def _restore_checkpoint_state(self, state):
+        self.cur_user = state.get('cur_user')
+        self.user_screen_name = state.get('user_screen_name')
+        self.cur_draft_event = state.get('cur_draft_event')
+        self.cur_rank_data = state.get('cur_rank_data')
+        self.last_raw_time = state.get('last_raw_time', '')
+        self.cur_log_time = datetime.datetime.fromisoformat(state['cur_log_time'])
+        self.last_utc_time = datetime.datetime.fromisoformat(state['last_utc_time'])
+        self.line_log_time = self.cur_log_time
+        self.line_raw_time = self.last_raw_time
+
+    def _save_checkpoint(self, filename, offset):
+        try:
+            self.checkpoint.save(filename, offset, self._get_checkpoint_state())
+        except Exception as e:
+            logger.warning(f'Could not save log checkpoint: {e}')
+
+    def __request_checkpoint(self, filename):
+        """Save a checkpoint once everything read so far has been handled, from the dispatch stage."""
+        self.__parse_stage.put(functools.partial(
+            self.__save_checkpoint_at, filename, self.entry_boundary_offset, self.line_log_time, self.line_raw_time))
+
+    def __save_checkpoint_at(self, filename, offset, log_time, raw_time):
+        self.cur_log_time = log_time
+        self.last_raw_time = raw_time
+        self._save_checkpoint(filename, offset)
+
     def parse_log(self, filename, follow):
         """
         Parse messages from a log file and pass the data along to the API endpoint.
 
+        When following, the byte offset of the last processed entry is checkpointed so that a restart
+        resumes from there instead of re-parsing the whole log, unless the file was replaced or truncated.
+
+        Lines are read on the calling thread, while decoding and handling messages happen on the stages
+        of self.pipeline, and submissions are posted by the API client's workers.
+
         :param filename: The filename for the log file to parse.
         :param follow:   Whether or not to continue looking for updates to the file after parsing
                          all the initial lines.
         """
+        self.pipeline.start()
+        try:
+            self.__parse_log(filename, follow)
+        finally:
+            self.pipeline.close()
+            self._api_client.flush()
+            self.__log_pipeline_metrics()
+
+    def __log_pipeline_metrics(self):
+        logger.info(f'Log pipeline: {self.pipeline.format_metrics()}')
+        logger.info(f'Submissions: {self._api_client.format_metrics()}')
+
+    def __parse_log(self, filename, follow):
+        last_metrics_time = time.time()
         while True:
+            self.pipeline.drain()
             self._reinitialize()
             last_read_time = time.time()
             last_file_size = 0
             try:
-                with open(filename, errors='replace') as f:
-                    while True:                       
-                        line = f.readline()
-                        file_size = pathlib.Path(filename).stat().st_size
-                        if line:
-                            self.__append_line(line)
+                offset = 0
+                if follow:
+                    offset, state = self.checkpoint.load(filename)
+                    if offset > 0:
+                        logger.info(f'Resuming {filename} from byte {offset}')
+                        self._restore_checkpoint_state(state)
+                self.entry_boundary_offset = offset
+                last_checkpoint_time = time.time()
+                with open(filename, 'rb') as f, FileChangeWaiter(filename) as waiter:
+                    f.seek(offset)
+                    reader = LogReader(f, offset)
+                    while True:
+                        lines = reader.read_lines()
+                        if lines is None and not follow:
+                            # Nothing more will be written, so the last line is complete even without a newline
+                            pending_line = reader.flush_pending()
+                            lines = [pending_line] if pending_line is not None else None
+                        if lines is not None:
+                            for line_offset, line in lines:
+                                if line.endswith(b'\r\n'):
+                                    line = line[:-2] + b'\n'
+                                self.__append_line(line.decode('utf-8', errors='replace'), line_offset)
                             last_read_time = time.time()
-                            last_file_size = file_size
+                            if follow and last_read_time - last_checkpoint_time >= CHECKPOINT_INTERVAL_SECONDS:
+                                self.__request_checkpoint(filename)
+                                last_checkpoint_time = last_read_time
                         else:
                             self.__handle_complete_log_entry()
-                            last_modified_time = os.stat(filename).st_mtime
+                            offset = reader.offset
+                            if follow and self.entry_boundary_offset != offset:
+                                self.entry_boundary_offset = offset
+                                self.__request_checkpoint(filename)
+                                last_checkpoint_time = time.time()
+                            file_stat = os.stat(filename)
+                            file_size = file_stat.st_size
+                            last_modified_time = file_stat.st_mtime
                             if file_size < last_file_size:
                                 logger.info(f'Starting from beginning of file as file is smaller than before (previous = {last_file_size}; current = {file_size})')
                                 break
@@ -481,12 +875,18 @@ class Follower:
                                 logger.info(f'Starting from beginning of file as file has been updated much more recently than the last read (previous = {last_read_time}; current = {last_modified_time})')
                                 break
                             elif follow:
+                                last_file_size = file_size
                                 OVERLAY_UPDATE_INTERVAL_MAX_TIME_ELAPSED = time.time() - self.last_overlay_update >= self.OVERLAY_UPDATE_INTERVAL_MAX_TIME
                                 #logger.info(str(current_time - self.last_overlay_update)+" seconds since last update")
                                 if OVERLAY_UPDATE_INTERVAL_MAX_TIME_ELAPSED:
                                     logger.info("updating due to time elapsing")
-                                    self.__update_overlays()
-                                time.sleep(SLEEP_TIME)
+                                    self.last_overlay_update = time.time()
+                                    # Skipped if the previous refresh is still waiting, rather than blocking the reader
+                                    self.__overlay_stage.offer(self.__update_overlays)
+                                if time.time() - last_metrics_time >= PIPELINE_METRICS_INTERVAL_SECONDS:
+                                    self.__log_pipeline_metrics()
+                                    last_metrics_time = time.time()
+                                waiter.wait(SLEEP_TIME)
                             else:
                                 break
             except FileNotFoundError:
@@ -500,6 +900,8 @@ class Follower:
                 break
 
             if not follow:
+                self.pipeline.drain()
+                self._api_client.flush()
                 logger.info('Done processing file.')
                 break
 
@@ -507,7 +909,7 @@ class Follower:
         logger.error(message)
         #self._api_client.submit_error_info(self._add_base_api_data({
         #    "blob": self.current_debug_blob,
-        #    "recent_lines": self.recent_lines,
+        #    "recent_lines": list(self.recent_lines),
         #    "stacktrace": traceback.format_exc(),
         #}))
 
@@ -525,62 +927,90 @@ class Follower:
         elif (line.startswith('DETAILED LOGS: ENABLED')):
             logger.info('Detailed logs enabled in MTGA.')
 
-    def __append_line(self, line):
-        """Add a complete line (not necessarily a complete message) from the log."""
-        if len(self.recent_lines) >= _ERROR_LINES_RECENCY:
-            self.recent_lines.pop(0)
+    def __append_line(self, line, offset=None):
+        """
+        Add a complete line (not necessarily a complete message) from the log.
+
+        :param offset: Byte offset of the line in the log, recorded as the latest entry boundary
+                       when the line starts a new message.
+        """
         self.recent_lines.append(line)
 
-        self.__check_detailed_logs(line)
+        line_kind = classify_log_line(line)
+        if line_kind == LINE_CONTINUATION:
+            self.__buffer_text(line)
+            return
+
+        if line_kind == LINE_DETAILED_LOGS:
+            self.__check_detailed_logs(line)
 
         self.__maybe_handle_account_info(line)
 
-        timestamp_match = TIMESTAMP_REGEX.match(line)
-        if timestamp_match:
-            self.last_raw_time = timestamp_match.group(1)
-            self.cur_log_time = extract_time(self.last_raw_time)
+        if line_kind == LINE_TIMESTAMP:
+            timestamp_match = TIMESTAMP_REGEX.match(line)
+            if timestamp_match:
+                self.line_raw_time = timestamp_match.group(1)
+                self.line_log_time = self.timestamp_parser.parse(self.line_raw_time)
 
-        match = LOG_START_REGEX_UNTIMED.match(line)
-        if match:
+        if line_kind == LINE_LOG_START:
             self.__handle_complete_log_entry()
+            if offset is not None:
+                self.entry_boundary_offset = offset
 
             timed_match = LOG_START_REGEX_TIMED.match(line)
             if timed_match:
-                self.last_raw_time = timed_match.group(2)
-                self.cur_log_time = extract_time(self.last_raw_time)
-                self.buffer.append(line[timed_match.end():])
+                self.line_raw_time = timed_match.group(2)
+                self.line_log_time = self.timestamp_parser.parse(self.line_raw_time)
+                self.__buffer_text(line[timed_match.end():])
             else:
-                self.buffer.append(line[match.end():])
+                self.__buffer_text(line[LOG_START_REGEX_UNTIMED.match(line).end():])
         else:
-            self.buffer.append(line)
+            self.__buffer_text(line)
+
+    def __buffer_text(self, text):
+        self.buffer.append(text)
+        self.buffer_digest.update(text.encode())
+
+    def __reset_buffer(self):
+        self.buffer = []
+        self.buffer_digest = hashlib.blake2b(digest_size=16)
+
+    def __is_repeated_blob(self, digest):
+        """Check whether a message with this digest was seen recently, and remember it if not."""
+        if digest in self.recent_blob_digest_set:
+            return True
+        if len(self.recent_blob_digests) == self.recent_blob_digests.maxlen:
+            self.recent_blob_digest_set.discard(self.recent_blob_digests[0])
+        self.recent_blob_digests.append(digest)
+        self.recent_blob_digest_set.add(digest)
+        return False
 
     def __handle_complete_log_entry(self):
         """Mark the current log message complete. Should be called when waiting for more log messages."""   
         if len(self.buffer) == 0:
             return
-        if self.cur_log_time is None:
-            self.buffer = []
+        if self.line_log_time is None:
+            self.__reset_buffer()
             return
 
         full_log = ''.join(self.buffer)
-        self.current_debug_blob = full_log
-        if full_log != self.last_blob:
-            try:
-                self.__handle_blob(full_log)
-            except Exception as e:
-                self._log_error(
-                    message=f'Error {e} while processing {full_log}',
-                    error=e,
-                    stacktrace=traceback.format_exc(),
-                )
-
-            self.last_blob = full_log
+        if not self.__is_repeated_blob(self.buffer_digest.digest()):
+            self.__parse_stage.put(LogEntry(full_log, self.line_log_time, self.line_raw_time))
         else:
             logger.info(f'Skipping repeated complete log entry: {full_log}')
 
-        self.buffer = []
+        self.__reset_buffer()
         #self.cur_log_time = None
 
+    def __maybe_get_raw_utc_timestamp(self, full_log, json_start):
+        match = RAW_TIMESTAMP_REGEX.search(full_log, json_start)
+        if match is None:
+            return None
+        try:
+            return parse_utc_timestamp(match.group(1))
+        except (ValueError, OverflowError):
+            return None
+
     def __maybe_get_utc_timestamp(self, blob):
         timestamp = None
         if 'timestamp' in blob:
@@ -593,40 +1023,69 @@ class Follower:
         if timestamp is None:
             return None
 
-        try:
-            timestamp_value = int(timestamp)
+        return parse_utc_timestamp(timestamp)
 
-            if timestamp_value < MAX_MILLISECONDS_SINCE_EPOCH:
-                return datetime.datetime.fromtimestamp(timestamp_value * 0.001)
+    def __parse_entry(self, item):
+        """Parse stage: decode a complete log message and find its handler, passing anything else through."""
+        if not isinstance(item, LogEntry):
+            self.__dispatch_stage.put(item)
+            return
 
-            else:
-                seconds_since_year_1 = timestamp_value / 10000000
-                return datetime.datetime.fromordinal(1) + datetime.timedelta(seconds=seconds_since_year_1)
+        try:
+            parsed = self.__parse_blob(item)
+        except Exception as e:
+            # Only keep the text of a message around when it is needed to report an error
+            self.current_debug_blob = item.full_log
+            self._log_error(
+                message=f'Error {e} while processing {item.full_log}',
+                error=e,
+                stacktrace=traceback.format_exc(),
+            )
+            return
+        if parsed is not None:
+            self.__dispatch_stage.put(parsed)
 
-        except ValueError:
-            return dateutil.parser.isoparse(timestamp)
+    def __parse_blob(self, entry):
+        """
+        Attempt to parse a complete log message.
 
-    def __handle_blob(self, full_log):
-        """Attempt to parse a complete log message and send the data if relevant."""
+        :returns: A ParsedEntry, or None if the message has no timestamp and nothing to handle.
+        """
+        full_log = entry.full_log
         match = JSON_START_REGEX.search(full_log)
         #logger.info(full_log)
         if not match:
-            return
+            return None
+
+        def parsed(utc_time, timestamp=None, json_obj=None, handler=None):
+            if utc_time is None and handler is None:
+                return None
+            return ParsedEntry(full_log, entry.log_time, entry.raw_time, utc_time, timestamp, json_obj, handler)
+
+        # Skip decoding messages that are too old or that no handler would accept
+        raw_time = self.__maybe_get_raw_utc_timestamp(full_log, match.start())
+        if (raw_time is not None and self.max_entry_age_seconds is not None
+                and get_log_entry_age_seconds(raw_time) > self.max_entry_age_seconds):
+            logger.info(f'Skipping old log entry from {raw_time}')
+            return parsed(raw_time)
+        if not self._BLOB_HANDLERS.might_match(full_log):
+            return parsed(raw_time)
 
         try:
             json_obj, end = self.json_decoder.raw_decode(full_log, match.start())
         except json.JSONDecodeError as e:
-            logger.debug(f'Ran into error {e} when parsing at {self.cur_log_time}. Data was: {full_log}')
-            return
+            logger.debug(f'Ran into error {e} when parsing at {entry.log_time}. Data was: {full_log}')
+            return parsed(raw_time)
 
         json_obj = self.__extract_payload(json_obj)
-        if type(json_obj) != dict: return
+        if type(json_obj) != dict: return parsed(raw_time)
 
         maybe_time = None
+        utc_time = raw_time
         try:
             maybe_time = self.__maybe_get_utc_timestamp(json_obj)
             if maybe_time is not None:
-                self.last_utc_time = maybe_time
+                utc_time = maybe_time
                 
                 #Ensure maybe_time is timezone-aware
                 if maybe_time.tzinfo is None:
@@ -639,72 +1098,65 @@ class Follower:
                 #logger.info(f'Current time: {current_time}')
                 #logger.info(f'Time difference: {time_difference} seconds')
                 
-                if time_difference > 10:
+                if self.max_entry_age_seconds is not None and time_difference > self.max_entry_age_seconds:
                     logger.info(f'Skipping old log entry from {maybe_time}')
-                    return
+                    return parsed(utc_time)
                 else:
                     logger.info(f'Processing log entry from {maybe_time}')
         except Exception as e:
             logger.error(f'Error processing timestamp: {e}')
             logger.error(f'maybe_time: {maybe_time}, type: {type(maybe_time)}')
             logger.error(f'current_time: {current_time}, type: {type(current_time)}')
+            return parsed(utc_time)
+
+
+        handler = self._BLOB_HANDLERS.find(self, full_log[:match.start()], json_obj)
+        return parsed(utc_time, maybe_time, json_obj, handler)
+
+    def __dispatch(self, item):
+        """Dispatch stage: apply a parsed log message, or a call queued by the reader, to the follower's state."""
+        if not isinstance(item, ParsedEntry):
+            item()
             return
 
+        self.cur_log_time = item.log_time
+        self.last_raw_time = item.raw_time
+        if item.utc_time is not None:
+            self.last_utc_time = item.utc_time
+        if item.handler is None:
+            return
 
-        if json_value_matches('Client.Connected', ['params', 'messageName'], json_obj): # Doesn't exist any more
-            self.__handle_login(json_obj)
-        elif 'SceneChange' in full_log and 'fromSceneName' in json_obj:
-            self.__handle_scenechange(json_obj)
-        elif 'Event_Join' in full_log and 'EventName' in json_obj:
-            self.__handle_joined_pod(json_obj)
-        elif 'DraftStatus' in json_obj:
-            self.__handle_bot_draft_pack(json_obj)
-        elif 'BotDraft_DraftPick' in full_log and 'PickInfo' in json_obj:
-            self.__handle_bot_draft_pick(json_obj['PickInfo'])
-        elif 'LogBusinessEvents' in full_log and 'PickGrpId' in json_obj:
-            self.__handle_human_draft_combined(json_obj)
-        elif 'LogBusinessEvents' in full_log and 'WinningType' in json_obj:
-            self.__handle_log_business_game_end(json_obj)
-        elif 'Draft.Notify ' in full_log and 'method' not in json_obj:
-            self.__handle_human_draft_pack(json_obj)
-        elif 'Event_SetDeck' in full_log and 'EventName' in json_obj:
-            self.__handle_deck_submission(json_obj)
-        elif 'Event_GetCourses' in full_log and 'Courses' in json_obj:
-            self.__handle_ongoing_events(json_obj)
-        elif 'Event_ClaimPrize' in full_log and 'EventName' in json_obj:
-            self.__handle_claim_prize(json_obj)
-        elif 'Draft_CompleteDraft' in full_log and 'DraftId' in json_obj:
-            self.__handle_event_course(json_obj)
-        elif 'authenticateResponse' in json_obj:
-            self.__update_screen_name(json_obj['authenticateResponse']['screenName'])
-        elif 'matchGameRoomStateChangedEvent' in json_obj:
-            self.__handle_match_state_changed(json_obj)
-        elif 'greToClientEvent' in json_obj and 'greToClientMessages' in json_obj['greToClientEvent']:
-            try:
-                for message in json_obj['greToClientEvent']['greToClientMessages']:
-                    self.__handle_gre_to_client_message(message, maybe_time)
-            except Exception as e:
-                self._log_error(
-                    message=f'Error {e} parsing GRE to client messages from {json_obj}',
-                    error=e,
-                    stacktrace=traceback.format_exc(),
-                )
-        elif json_value_matches('ClientToMatchServiceMessageType_ClientToGREMessage', ['clientToMatchServiceMessageType'], json_obj):
-            self.__handle_client_to_gre_message(json_obj.get('payload', {}), maybe_time)
-        elif json_value_matches('ClientToMatchServiceMessageType_ClientToGREUIMessage', ['clientToMatchServiceMessageType'], json_obj):
-            self.__handle_client_to_gre_ui_message(json_obj.get('payload', {}), maybe_time)
-        elif 'Rank_GetCombinedRankInfo' in full_log and 'limitedSeasonOrdinal' in json_obj:
-            self.__handle_self_rank_info(json_obj)
-        elif ' PlayerInventory.GetPlayerCardsV3 ' in full_log and 'method' not in json_obj: # Doesn't exist any more
-            self.__handle_collection(json_obj)
-        elif 'DTO_InventoryInfo' in json_obj:
-            self.__handle_inventory(json_obj['DTO_InventoryInfo'])
-        elif 'NodeStates' in json_obj and 'RewardTierUpgrade' in json_obj['NodeStates']:
-            self.__handle_player_progress(json_obj)
-        elif 'FrontDoorConnection.Close ' in full_log:
-            self.__reset_current_user()
-        elif 'Reconnect result : Connected' in full_log:
-            self.__handle_reconnect_result()
+        try:
+            item.handler.handle(self, item.json_obj, item.timestamp)
+        except Exception as e:
+            self.current_debug_blob = item.full_log
+            self._log_error(
+                message=f'Error {e} while processing {item.full_log}',
+                error=e,
+                stacktrace=traceback.format_exc(),
+            )
+
+    def __run_overlay_update(self, update):
+        """Overlay stage: run a screen-capturing overlay update."""
+        update()
+
+    def __on_pipeline_error(self, item, error):
+        self._log_error(
+            message=f'Error {error} in log pipeline while processing {item}',
+            error=error,
+            stacktrace=traceback.format_exc(),
+        )
+
+    def __handle_gre_to_client_event(self, json_obj, timestamp):
+        try:
+            for message in json_obj['greToClientEvent']['greToClientMessages']:
+                self.__handle_gre_to_client_message(message, timestamp)
+        except Exception as e:
+            self._log_error(
+                message=f'Error {e} parsing GRE to client messages from {json_obj}',
+                error=e,
+                stacktrace=traceback.format_exc(),
+            )
 
     def __try_decode(self, blob, key):
         try:
@@ -1018,16 +1470,27 @@ class Follower:
         self.__clear_game_data(submit_pending_game=submit_pending_game)
 
     def __maybe_handle_account_info(self, line):
+        """Queue the account in a line, if any, to be applied in order with the log messages around it."""
+        if 'Match' not in line and 'Updated account' not in line:
+            return
+
         match = ACCOUNT_INFO_REGEX.match(line)
         if match:
-            screen_name = match.group(1)
-            self.cur_user = match.group(2)
-            self.__update_screen_name(screen_name)
+            self.__parse_stage.put(functools.partial(
+                self.__set_account_info, self.line_log_time, self.line_raw_time, match.group(2), match.group(1)))
             return
 
         match = MATCH_ACCOUNT_INFO_REGEX.match(line)
         if match:
-            self.cur_user = match.group(2) or match.group(3)
+            self.__parse_stage.put(functools.partial(
+                self.__set_account_info, self.line_log_time, self.line_raw_time, match.group(2) or match.group(3)))
+
+    def __set_account_info(self, log_time, raw_time, user, screen_name=None):
+        self.cur_log_time = log_time
+        self.last_raw_time = raw_time
+        self.cur_user = user
+        if screen_name is not None:
+            self.__update_screen_name(screen_name)
 
     def __handle_ongoing_events(self, json_obj):
         """Handle 'Event_GetCourses' messages."""
@@ -1225,9 +1688,6 @@ class Follower:
             return missing_cards
             #logger.info(missing_cards)
 
-    def __get_card_data_from_mtgjson(self, setsymbol):
-        self.__cards_in_set_mtgjson_df = GetDataForSetFromMTGJson(setsymbol)
-
     def __populate_cards_in_set_df(self, pack):
         try:
             #logger.info(pack['event_name'])
@@ -1236,11 +1696,13 @@ class Follower:
             if second_term=="RemixDraft":
                 second_term = "Chaos"
             logger.info("getting card data for set "+second_term)
-            self.__get_card_data_from_mtgjson(second_term)
-            self.__cards_in_set_df = get_card_data_for_set(second_term)
-            if self.__cards_in_set_df is None:
+            mtgjson_df, cards_in_set_df = load_set_data(second_term)
+            self.__mtgjson_card_index = build_card_index(mtgjson_df)
+            if cards_in_set_df is None:
                 if self.__set_data_not_available is False:
                     self.__set_data_not_available = True       
+            else:
+                self.__card_index = build_card_index(cards_in_set_df)
         except Exception as e:
             # Handle any exception thrown by get_card_positions
             print(f"Error with __populate_cards_in_set_df: {e}")        
@@ -1248,7 +1710,7 @@ class Follower:
 
     def __sort_pack(self, pack):
         # Get card info for each card in the pack
-        card_packdebug_info = [get_card_packdebug_info(card_id, self.__cards_in_set_mtgjson_df) for card_id in pack['card_ids']]
+        card_packdebug_info = [get_card_packdebug_info(card_id, self.__mtgjson_card_index) for card_id in pack['card_ids']]
         
         # Define a custom sorting key function
         def sort_key(card):
@@ -1283,7 +1745,7 @@ class Follower:
         self.last_overlay_update = time.time()
         # Implement the logic to update overlays here
         # This method should be called regularly to reflect any UI changes
-        if self.__currentScene != "Draft":
+        if self.headless or self.__currentScene != "Draft":
             return
         try:
             if self.__check_for_new_overlays():
@@ -1355,6 +1817,8 @@ class Follower:
         self.follower_thread.update_overlay(card_overlays, self.__last_pack_info)
 
     def delayed_prep_and_show(self, pack):
+        if self.headless:
+            return
         threading.Timer(.7, lambda: self.__prep_and_show_overlay(pack)).start()
         #self.__prep_and_show_overlay(pack)
 
@@ -1363,7 +1827,7 @@ class Follower:
         self.last_overlay_update = time.time()  
         try:
             self.__last_pack = pack
-            if self.__cards_in_set_df is None:
+            if self.__card_index is None:
                 if not self.__set_data_not_available:
                     self.__populate_cards_in_set_df(pack)        
             missing_cards = self.__update_draft_opens(pack)
@@ -1372,11 +1836,11 @@ class Follower:
             
             pack, card_packdebug_info = self.__sort_pack(pack)
             
-            if self.__cards_in_set_df is None:
+            if self.__card_index is None:
                 #data not available yet so we use mtgjson data without stats
-                self.__last_card_details_withstats = [get_card_info(card_id, self.__cards_in_set_mtgjson_df) for card_id in pack['card_ids']]
+                self.__last_card_details_withstats = [get_card_info(card_id, self.__mtgjson_card_index) for card_id in pack['card_ids']]
             else:
-                self.__last_card_details_withstats = [get_card_info(card_id, self.__cards_in_set_df) for card_id in pack['card_ids']]
+                self.__last_card_details_withstats = [get_card_info(card_id, self.__card_index) for card_id in pack['card_ids']]
 
             #debug a full pack:
             if len(pack['card_ids']) > 13:
@@ -1392,7 +1856,7 @@ class Follower:
             #pack_info += "\n" + "\n".join(card_details)
 
             if missing_cards is not None:
-                missing_card_names = [get_card_info(card_id, self.__cards_in_set_mtgjson_df) for card_id in missing_cards]
+                missing_card_names = [get_card_info(card_id, self.__mtgjson_card_index) for card_id in missing_cards]
                 missing_card_names_output = [card[0] for card in missing_card_names]
                 pack_info += "\n" + "Cards that are missing: "
                 pack_info += "\n" + "\n".join(missing_card_names_output)
@@ -1431,7 +1895,7 @@ class Follower:
         #logger.info(json_obj['fromSceneName'])
         if json_obj['fromSceneName']=="Draft":
             #self.__overlay_manager.hide_overlay()
-            self._reinitialize()
+            self.__reset_state()
         elif json_obj['toSceneName']=="Draft":
             self.__currentScene = "Draft"
 
@@ -1826,17 +2290,19 @@ def verify_version(host, prompt_if_update_required):
 class FollowerThread(QThread):
     overlay_update_signal = pyqtSignal(list, str)
 
-    def __init__(self, token, host, debug_mode, log_file, once):
+    def __init__(self, token, host, debug_mode, log_file, once, json_backend=AUTO_BACKEND, client=None):
         super().__init__()
         self.token = token
         self.host = host
         self.debug_mode = debug_mode
         self.log_file = log_file
         self.once = once
+        self.json_backend = json_backend
+        self.client = client
         self.follower = None
 
     def run(self):
-        self.follower = Follower(self.token, self, host=self.host, debug_mode=self.debug_mode)
+        self.follower = Follower(self.token, self, host=self.host, debug_mode=self.debug_mode, json_backend=self.json_backend, client=self.client)
         filepaths = POSSIBLE_CURRENT_FILEPATHS if self.log_file is None else (self.log_file,)
         
         for filename in filepaths:
@@ -1869,12 +2335,25 @@ def main():
     parser.add_argument('--once', action='store_true',
         help='Whether to stop after parsing the file once (default is to continue waiting for updates to the file)')
     parser.add_argument('-debug_mode', default=False)
+    parser.add_argument('--json_backend', choices=(AUTO_BACKEND, ) + JSON_BACKENDS, default=AUTO_BACKEND,
+        help='Library for decoding log messages. The default uses the fastest one installed.')
+    parser.add_argument('--outbox', default=OUTBOX_FILE,
+        help=f'File to keep undelivered submissions in until they are posted (default {OUTBOX_FILE})')
+    parser.add_argument('--no_outbox', action='store_true',
+        help='Keep undelivered submissions only in memory; they are lost if the follower exits')
+    parser.add_argument('--batch_url_template', default=None,
+        help='Post draft, inventory and rank submissions in batches to this endpoint, formatted with the '
+            + f'endpoint they are for (e.g. {api_client.DEFAULT_BATCH_URL_TEMPLATE}). Only for hosts that accept batches.')
+    parser.add_argument('--sink', choices=SINKS, default='http',
+        help='Where submissions go: posted to --host (default), or stored in the local SQLite database --sink_file')
+    parser.add_argument('--sink_file', default=LOCAL_SINK_FILE,
+        help=f'Database for --sink sqlite (default {LOCAL_SINK_FILE})')
     #args.debug_mode
 
     args = parser.parse_args()
 
     check_count = 0
-    while not verify_version(
+    while args.sink == 'http' and not verify_version(
         host=args.host,
         prompt_if_update_required=check_count % UPDATE_PROMPT_FREQUENCY == 0,
     ):
@@ -1887,9 +2366,19 @@ def main():
 
     overlay_manager = OverlayManager()
     
-    follower_thread = FollowerThread(token, args.host, args.debug_mode, args.log_file, args.once)
+    if args.sink == 'sqlite':
+        client = SqliteSink(args.sink_file)
+    else:
+        client = api_client.ApiClient(
+            host=args.host,
+            outbox_filename=None if args.no_outbox else args.outbox,
+            batch_url_template=args.batch_url_template,
+        )
+    follower_thread = FollowerThread(token, args.host, args.debug_mode, args.log_file, args.once, args.json_backend, client)
     follower_thread.overlay_update_signal.connect(overlay_manager.show_all_overlays)
     follower_thread.start()
+    # Write out buffered submissions (and stop the API client's workers) when the overlay exits
+    app.aboutToQuit.connect(client.close)
     overlay_manager.run()
     sys.exit(app.exec_())
     #processing_loop(args, token, overlay_manager)
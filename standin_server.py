@@ -0,0 +1,147 @@
+"""
+A local stand-in for the 17Lands API, for trying out the client without sending anything to the real site.
+
+It accepts every POST (plain or gzipped JSON), answers the client version check, keeps connections
+alive like a real server, and counts requests and connections per endpoint.
+
+POSTs under batch/, e.g. batch/pick, take a JSON array of submissions to the endpoint after it, as
+sent by an ApiClient with a batch URL template. Their submissions are counted as records of that
+endpoint, alongside the submissions posted to it one at a time.
+
+Run with `python standin_server.py --port 8017` and point the follower at it with
+`--host http://localhost:8017`.
+"""
+import argparse
+import gzip
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BATCH_PREFIX = 'batch/'
+
+
+class StandInStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = Counter()
+        self.records = Counter()
+        self.bytes_received = 0
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'connections': self.connections,
+                'requests': dict(self.requests),
+                'records': dict(self.records),
+                'bytes_received': self.bytes_received,
+            }
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; with Nagle on, each response on a kept-alive
+    # connection would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.stats.lock:
+            self.server.stats.connections += 1
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.server.stats.lock:
+            self.server.stats.bytes_received += len(data)
+        if self.headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        return json.loads(data)
+
+    def _endpoint(self):
+        return self.path.split('?')[0].strip('/')
+
+    def do_GET(self):
+        endpoint = self._endpoint()
+        with self.server.stats.lock:
+            self.server.stats.requests[endpoint] += 1
+        if endpoint == 'api/version_validation':
+            self._send_json(200, {'min_version': '0.0.0'})
+        else:
+            self._send_json(404, {'error': f'Unknown endpoint {endpoint}'})
+
+    def do_POST(self):
+        endpoint = self._endpoint()
+        try:
+            body = self._read_json()
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        if endpoint.startswith(BATCH_PREFIX):
+            if not isinstance(body, list):
+                self._send_json(400, {'error': 'A batch must be a JSON array'})
+                return
+            record_endpoint, record_count = endpoint[len(BATCH_PREFIX):], len(body)
+        elif isinstance(body, list):
+            self._send_json(400, {'error': f'Batches go to {BATCH_PREFIX}{endpoint}'})
+            return
+        else:
+            record_endpoint, record_count = endpoint, 1
+        with self.server.stats.lock:
+            self.server.stats.requests[endpoint] += 1
+            self.server.stats.records[record_endpoint] += record_count
+        self._send_json(200, {})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), verbose=False):
+        super().__init__(address, StandInRequestHandler)
+        self.stats = StandInStats()
+        self.verbose = verbose
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start_in_background(self):
+        """Serve from a daemon thread, e.g. for benchmarks. Stop with shutdown()."""
+        thread = threading.Thread(target=self.serve_forever, name='standin-server', daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the 17Lands API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8017)
+    args = parser.parse_args()
+
+    server = StandInServer((args.host, args.port), verbose=True)
+    print(f'Serving on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats.snapshot(), indent=2))
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
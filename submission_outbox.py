@@ -0,0 +1,124 @@
+"""
+A durable outbox for API submissions, so they survive the process exiting or the network dropping.
+
+Every submission is written to a SQLite database before it is posted and removed once it has been
+delivered. Whatever is still there when a client starts up was never delivered, and is posted again.
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, List, NamedTuple
+
+import seventeenlands.logging_utils
+
+
+logger = seventeenlands.logging_utils.get_logger('submission_outbox')
+
+DELIVERED_BATCH_SIZE = 64
+DELIVERED_BATCH_SECONDS = 1.0
+MAX_DELIVERY_ATTEMPTS = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    endpoint TEXT NOT NULL,
+    blob TEXT NOT NULL,
+    use_gzip INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+class OutboxEntry(NamedTuple):
+    id: int
+    endpoint: str
+    blob: Any
+    use_gzip: bool
+
+
+class SubmissionOutbox:
+    """
+    Submissions waiting to be delivered, in a SQLite database that is safe to use from several threads.
+
+    Appends are committed straight away, since they are what must not be lost. Deliveries are
+    batched: losing the last few to a crash only means posting them again on the next start.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filename, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(_SCHEMA)
+        self._delivered: List[int] = []
+        self._delivered_flushed_at = time.monotonic()
+        # Anything up to here was left over from a previous run
+        self.replay_up_to_id = self._connection.execute('SELECT COALESCE(MAX(id), 0) FROM outbox').fetchone()[0]
+
+    def append(self, endpoint: str, blob: Any, use_gzip: bool) -> int:
+        with self._lock:
+            cursor = self._connection.execute(
+                'INSERT INTO outbox (endpoint, blob, use_gzip, created_at) VALUES (?, ?, ?, ?)',
+                (endpoint, json.dumps(blob), int(use_gzip), time.time()),
+            )
+            return cursor.lastrowid
+
+    def get_pending(self, after_id: int, up_to_id: int, limit: int) -> List[OutboxEntry]:
+        """Undelivered entries with after_id < id <= up_to_id, oldest first."""
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT id, endpoint, blob, use_gzip FROM outbox WHERE id > ? AND id <= ? ORDER BY id LIMIT ?',
+                (after_id, up_to_id, limit),
+            ).fetchall()
+        return [OutboxEntry(row_id, endpoint, json.loads(blob), bool(use_gzip)) for row_id, endpoint, blob, use_gzip in rows]
+
+    def count_pending(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM outbox').fetchone()[0] - len(self._delivered)
+
+    def mark_delivered(self, entry_id: int):
+        with self._lock:
+            self._delivered.append(entry_id)
+            if (
+                len(self._delivered) >= DELIVERED_BATCH_SIZE
+                or time.monotonic() - self._delivered_flushed_at >= DELIVERED_BATCH_SECONDS
+            ):
+                self._flush_delivered()
+
+    def mark_failed(self, entry_id: int):
+        """Keep an entry for the next start, unless it has already failed too many times."""
+        with self._lock:
+            self._connection.execute('UPDATE outbox SET attempts = attempts + 1 WHERE id = ?', (entry_id, ))
+            deleted = self._connection.execute(
+                'DELETE FROM outbox WHERE id = ? AND attempts >= ?', (entry_id, MAX_DELIVERY_ATTEMPTS),
+            ).rowcount
+        if deleted:
+            logger.warning(f'Dropping outbox entry {entry_id} after {MAX_DELIVERY_ATTEMPTS} failed deliveries')
+
+    def _flush_delivered(self):
+        if self._delivered:
+            self._connection.execute('BEGIN')
+            self._connection.executemany('DELETE FROM outbox WHERE id = ?', ((entry_id, ) for entry_id in self._delivered))
+            self._connection.execute('COMMIT')
+            self._delivered = []
+        self._delivered_flushed_at = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush_delivered()
+
+    def compact(self):
+        """Remove delivered entries, and give back the space they took once nothing is pending."""
+        with self._lock:
+            self._flush_delivered()
+            if self._connection.execute('SELECT COUNT(*) FROM outbox').fetchone()[0] == 0:
+                self._connection.execute('VACUUM')
+            self._connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        self.compact()
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,215 @@
+"""
+Where the follower's submissions go.
+
+api_client.ApiClient posts them to 17Lands (or another host); SqliteSink keeps them in a local
+database instead, without any network I/O.
+"""
+import abc
+import datetime
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List
+
+import seventeenlands.logging_utils
+
+
+logger = seventeenlands.logging_utils.get_logger('submission_sinks')
+
+_ERROR_COOLDOWN = datetime.timedelta(minutes=2)
+
+DEFAULT_SQLITE_BATCH_SIZE = 1000
+DEFAULT_SQLITE_FLUSH_SECONDS = 1.0
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    player_id TEXT,
+    event_name TEXT,
+    draft_id TEXT,
+    match_id TEXT,
+    time TEXT,
+    blob TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submissions_event_name ON submissions (event_name);
+CREATE INDEX IF NOT EXISTS submissions_draft_id ON submissions (draft_id);
+CREATE INDEX IF NOT EXISTS submissions_match_id ON submissions (match_id);
+"""
+
+
+class SubmissionSink(abc.ABC):
+    """
+    The submit_* calls the follower makes. Subclasses implement _submit, and flush and close if they buffer.
+    """
+
+    def __init__(self):
+        self._last_error_posted_at = datetime.datetime.utcnow() - _ERROR_COOLDOWN
+
+    @abc.abstractmethod
+    def _submit(self, endpoint: str, blob: Any, use_gzip=False):
+        pass
+
+    def flush(self):
+        """Wait until every submission so far has been stored or sent."""
+
+    def close(self):
+        self.flush()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {}
+
+    def format_metrics(self) -> str:
+        return ''
+
+    def submit_collection(self, blob: Dict):
+        self._submit(endpoint='collection', blob=blob)
+
+    def submit_deck_submission(self, blob: Dict):
+        self._submit(endpoint='deck', blob=blob)
+
+    def submit_draft_pack(self, blob: Dict):
+        self._submit(endpoint='pack', blob=blob)
+
+    def submit_draft_pick(self, blob: Dict):
+        self._submit(endpoint='pick', blob=blob)
+
+    def submit_event_course_submission(self, blob: Dict):
+        self._submit(endpoint='event_course', blob=blob)
+
+    def submit_event_ended(self, blob: Dict):
+        self._submit(endpoint='event_ended', blob=blob)
+
+    def submit_event_submission(self, blob: Dict):
+        self._submit(endpoint='event', blob=blob)
+
+    def submit_game_result(self, blob: Dict):
+        self._submit(endpoint='game', blob=blob, use_gzip=True)
+
+    def submit_human_draft_pack(self, blob: Dict):
+        self._submit(endpoint='human_draft_pack', blob=blob)
+
+    def submit_human_draft_pick(self, blob: Dict):
+        self._submit(endpoint='human_draft_pick', blob=blob)
+
+    def submit_inventory(self, blob: Dict):
+        self._submit(endpoint='inventory', blob=blob)
+
+    def submit_ongoing_events(self, blob: Dict):
+        self._submit(endpoint='ongoing_events', blob=blob)
+
+    def submit_player_progress(self, blob: Dict):
+        self._submit(endpoint='player_progress', blob=blob)
+
+    def submit_rank(self, blob: Dict):
+        self._submit(endpoint='api/rank', blob=blob)
+
+    def submit_user(self, blob: Dict):
+        self._submit(endpoint='api/account', blob=blob)
+
+    def submit_error_info(self, blob: Dict):
+        now = datetime.datetime.utcnow()
+        if self._last_error_posted_at > now - _ERROR_COOLDOWN:
+            logger.warning(f'Waiting to post another error; last message was sent too recently ({self._last_error_posted_at.isoformat()})')
+            return
+
+        self._last_error_posted_at = now
+        self._submit(endpoint='api/client_errors', blob=blob, use_gzip=True)
+
+
+class SqliteSink(SubmissionSink):
+    """
+    Stores submissions in a local SQLite database, one row per submission, indexed by event, draft
+    and match.
+
+    Rows are buffered and written in a single transaction once batch_size of them have built up,
+    once the oldest has waited flush_seconds, and on flush().
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        batch_size: int = DEFAULT_SQLITE_BATCH_SIZE,
+        flush_seconds: float = DEFAULT_SQLITE_FLUSH_SECONDS,
+    ):
+        super().__init__()
+        self.filename = filename
+        self._batch_size = batch_size
+        self._flush_seconds = flush_seconds
+        self._flush_timer = None
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filename, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SQLITE_SCHEMA)
+        self._rows: List[tuple] = []
+        self._written = 0
+        self._transactions = 0
+        self._write_seconds = 0.0
+
+    def _submit(self, endpoint: str, blob: Any, use_gzip=False):
+        row = (
+            endpoint,
+            blob.get('player_id'),
+            blob.get('event_name'),
+            blob.get('draft_id'),
+            blob.get('match_id'),
+            blob.get('time'),
+            json.dumps(blob),
+        )
+        with self._lock:
+            self._rows.append(row)
+            if len(self._rows) >= self._batch_size:
+                self._write_rows()
+            elif self._flush_timer is None:
+                # Followers can go a long time between submissions, so don't wait for a full batch
+                self._flush_timer = threading.Timer(self._flush_seconds, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _write_rows(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._rows or self._connection is None:
+            return
+        start = time.perf_counter()
+        self._connection.execute('BEGIN')
+        self._connection.executemany(
+            'INSERT INTO submissions (endpoint, player_id, event_name, draft_id, match_id, time, blob) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            self._rows,
+        )
+        self._connection.execute('COMMIT')
+        self._write_seconds += time.perf_counter() - start
+        self._written += len(self._rows)
+        self._transactions += 1
+        self._rows = []
+
+    def flush(self):
+        with self._lock:
+            self._write_rows()
+
+    def close(self):
+        with self._lock:
+            self._write_rows()
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'written': self._written,
+                'buffered': len(self._rows),
+                'transactions': self._transactions,
+                'write_seconds': round(self._write_seconds, 3),
+            }
+
+    def format_metrics(self) -> str:
+        metrics = self.get_metrics()
+        return (
+            f"{metrics['written']} written to {self.filename} in {metrics['transactions']} transactions "
+            f"({metrics['write_seconds']}s), {metrics['buffered']} buffered"
+        )